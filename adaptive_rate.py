@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Adaptive Rate Controller
+AIMD congestion control for light updates, driven by the round-trip time
+between a command and the state echo Zigbee2MQTT publishes for the light
+"""
+
+import threading
+import time
+from typing import Dict
+
+
+class AdaptiveRateController:
+    """
+    Picks the update rate and transition length from measured mesh latency
+
+    Every set command starts a round trip for its light (the oldest
+    unanswered command counts, so queueing in Zigbee2MQTT shows up as
+    growing RTT). The state echo ends it. Echoes faster than the target
+    RTT raise the rate additively, at most once per RTT. Slow echoes and
+    missing echoes cut it multiplicatively.
+    """
+
+    def __init__(self, config: Dict, initial_interval_ms: float = 100):
+        self.min_hz = config.get('min_hz', 1.0)
+        self.max_hz = config.get('max_hz', 20.0)
+        self.target_rtt = config.get('target_rtt_ms', 300) / 1000.0
+        self.echo_timeout = config.get('echo_timeout_ms', 2000) / 1000.0
+        self.increase_hz = config.get('increase_hz', 0.5)
+        self.decrease_factor = config.get('decrease_factor', 0.5)
+        self.min_transition = config.get('min_transition', 0.05)
+        self.max_transition = config.get('max_transition', 1.0)
+
+        self.rate_hz = max(self.min_hz, min(self.max_hz, 1000.0 / initial_interval_ms))
+        self.srtt = None
+        self.pending = {}  # light name -> send time of oldest unanswered command
+        self.echoes = 0
+        self.drops = 0
+        self.last_change = time.monotonic()
+        self.lock = threading.Lock()
+
+    def on_command_sent(self, light_name: str):
+        """Record a set command for a light"""
+        now = time.monotonic()
+        with self.lock:
+            sent = self.pending.get(light_name)
+            if sent is None:
+                self.pending[light_name] = now
+            elif now - sent > self.echo_timeout:
+                self.drops += 1
+                self._decrease(now)
+                self.pending[light_name] = now
+
+    def on_state_echo(self, light_name: str):
+        """Record a state message from a light, completing its round trip"""
+        now = time.monotonic()
+        with self.lock:
+            sent = self.pending.pop(light_name, None)
+            if sent is None:
+                return
+
+            rtt = now - sent
+            self.echoes += 1
+            self.srtt = rtt if self.srtt is None else 0.875 * self.srtt + 0.125 * rtt
+
+            if rtt > self.target_rtt:
+                self._decrease(now)
+            elif now - self.last_change >= max(self.srtt, 1.0 / self.rate_hz):
+                self.rate_hz = min(self.max_hz, self.rate_hz + self.increase_hz)
+                self.last_change = now
+
+    def _decrease(self, now: float):
+        # One cut per round trip, so one congestion event is not punished repeatedly
+        if now - self.last_change < (self.srtt or 0.0):
+            return
+        self.rate_hz = max(self.min_hz, self.rate_hz * self.decrease_factor)
+        self.last_change = now
+
+    def _expire(self, now: float):
+        expired = [light for light, sent in self.pending.items() if now - sent > self.echo_timeout]
+        for light in expired:
+            del self.pending[light]
+            self.drops += 1
+        if expired:
+            self._decrease(now)
+
+    def interval(self) -> float:
+        """Seconds between updates at the current rate"""
+        with self.lock:
+            self._expire(time.monotonic())
+            return 1.0 / self.rate_hz
+
+    def interval_ms(self) -> float:
+        return self.interval() * 1000.0
+
+    def transition(self) -> float:
+        """Transition time that bridges the gap to the next update"""
+        return max(self.min_transition, min(self.max_transition, self.interval()))
+
+    def metrics(self) -> Dict:
+        """Current rate and latency statistics"""
+        with self.lock:
+            return {
+                'rate_hz': round(self.rate_hz, 2),
+                'interval_ms': round(1000.0 / self.rate_hz, 1),
+                'srtt_ms': round(self.srtt * 1000.0, 1) if self.srtt is not None else None,
+                'echoes': self.echoes,
+                'drops': self.drops,
+                'pending': len(self.pending)
+            }
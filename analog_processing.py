@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Analog Stick Processing
+Radial deadzones, response curves and an alpha-beta motion predictor that
+sends the value the stick will have reached by the time the bulbs respond
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+CENTER = 127.5
+
+
+def apply_curve(magnitude: float, curve: str, strength: float) -> float:
+    """
+    Shape a 0-1 stick magnitude
+
+    Curves:
+        linear: unchanged
+        power:  magnitude ** strength (strength > 1 gives finer control near center)
+        expo:   blend of linear and cubic, strength 0 (linear) to 1 (cubic)
+    """
+    if curve == 'power':
+        return magnitude ** strength
+    if curve == 'expo':
+        return (1.0 - strength) * magnitude + strength * magnitude ** 3
+    return magnitude
+
+
+class AlphaBetaFilter:
+    """Tracks position and velocity of one axis"""
+
+    def __init__(self, alpha: float, beta: float):
+        self.alpha = alpha
+        self.beta = beta
+        self.position = 0.0
+        self.velocity = 0.0
+        self.last_time = None
+
+    def update(self, measurement: float, now: float):
+        if measurement == 0.0 or (abs(measurement) < abs(self.position) and self.velocity * self.position > 0):
+            # Back at rest, or turned back toward it: the old motion no longer applies
+            self.position = measurement
+            self.velocity = 0.0
+            self.last_time = now
+            return
+
+        if self.last_time is None:
+            self.position = measurement
+            self.last_time = now
+            return
+
+        dt = now - self.last_time
+        if dt <= 0:
+            self.position = measurement
+            return
+        self.last_time = now
+
+        predicted = self.position + self.velocity * dt
+        residual = measurement - predicted
+        self.position = predicted + self.alpha * residual
+        self.velocity += self.beta * residual / dt
+
+    def predict(self, lead: float) -> float:
+        predicted = self.position + self.velocity * lead
+        if predicted * self.position < 0:
+            return 0.0  # Never predict past rest
+        return predicted
+
+
+class AnalogProcessor:
+    """
+    Turns raw 0-255 stick events into processed 0-255 values
+
+    Sticks are handled as (x, y) pairs so the deadzone is circular. The
+    output is rescaled to start at center at the deadzone edge, so values
+    move smoothly instead of jumping when the stick leaves the deadzone.
+    """
+
+    def __init__(self, config: Dict, stick_pairs: List[Tuple[str, str]], deadzone: float):
+        self.deadzone = deadzone / CENTER
+        self.radial = config.get('deadzone_shape', 'radial') == 'radial'
+        self.curve = config.get('curve', 'linear')
+        self.curve_strength = config.get('curve_strength', 0.5)
+
+        predictor = config.get('predictor', {})
+        self.predict_enabled = predictor.get('enabled', True)
+        self.alpha = predictor.get('alpha', 0.6)
+        self.beta = predictor.get('beta', 0.2)
+        self.lead = predictor.get('lead_ms', 150) / 1000.0
+        self.max_lead = predictor.get('max_lead_ms', 300) / 1000.0
+
+        self.min_transition = config.get('min_transition', 0.05)
+        self.full_speed = config.get('velocity_for_min_transition', 4.0)
+
+        self.partner = {}
+        for x_axis, y_axis in stick_pairs:
+            self.partner[x_axis] = y_axis
+            self.partner[y_axis] = x_axis
+
+        self.raw = {}  # axis -> normalized raw position (-1..1)
+        self.filters = {}
+
+    def update(self, axis: str, value: int, now: float):
+        """Feed a raw stick event"""
+        self.raw[axis] = max(-1.0, min(1.0, (value - CENTER) / CENTER))
+
+        partner = self.partner.get(axis)
+        if partner is not None and self.radial:
+            self._update_pair(axis, partner, now)
+        else:
+            self._filter(axis).update(self._shape(self.raw[axis]), now)
+
+    def _update_pair(self, axis: str, partner: str, now: float):
+        x = self.raw[axis]
+        y = self.raw.get(partner, 0.0)
+        magnitude = math.hypot(x, y)
+
+        if magnitude <= self.deadzone:
+            scale = 0.0
+        else:
+            scale = self._shape(min(1.0, magnitude)) / magnitude
+
+        # Both axes of the stick change when the magnitude changes
+        self._filter(axis).update(x * scale, now)
+        self._filter(partner).update(y * scale, now)
+
+    def _shape(self, value: float) -> float:
+        """Deadzone rescale and response curve for a signed value"""
+        magnitude = abs(value)
+        if magnitude <= self.deadzone:
+            return 0.0
+        magnitude = (magnitude - self.deadzone) / (1.0 - self.deadzone)
+        return math.copysign(apply_curve(min(1.0, magnitude), self.curve, self.curve_strength), value)
+
+    def _filter(self, axis: str) -> AlphaBetaFilter:
+        if axis not in self.filters:
+            self.filters[axis] = AlphaBetaFilter(self.alpha, self.beta)
+        return self.filters[axis]
+
+    def value(self, axis: str, lead: float = None) -> int:
+        """
+        Processed value in the raw 0-255 range
+
+        Args:
+            axis: Axis name (e.g. 'ABS_X')
+            lead: Seconds to predict ahead (default: configured lead_ms)
+        """
+        axis_filter = self._filter(axis)
+        if self.predict_enabled:
+            lead = self.lead if lead is None else min(lead, self.max_lead)
+            normalized = axis_filter.predict(lead)
+        else:
+            normalized = axis_filter.position
+        normalized = max(-1.0, min(1.0, normalized))
+        return int(round(CENTER + normalized * CENTER))
+
+    def transition(self, axis: str, base: float) -> float:
+        """Transition time: short while the stick moves fast, base when it is slow"""
+        speed = min(1.0, abs(self._filter(axis).velocity) / self.full_speed)
+        return max(self.min_transition, base - (base - self.min_transition) * speed)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Publish Benchmark
+Measures the per-frame Python overhead of sending one command to every
+light: one publish per light vs. one batched frame per update.
+
+Runs against a local sink that acts like a broker (answers CONNECT and
+discards everything else), so only the client side is measured.
+
+Usage:
+    python3 benchmark_publish.py [--lights 20] [--frames 2000]
+"""
+
+import argparse
+import socket
+import threading
+import time
+
+from zigbee_light_controller import ZigbeeLightController, mqtt
+
+
+def start_sink_broker():
+    """Start a broker stand-in that acknowledges CONNECT and drains the socket"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind(('127.0.0.1', 0))
+    server.listen(8)
+
+    def serve_client(conn):
+        first = True
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                conn.close()
+                return
+            if first:
+                conn.sendall(bytes([0x20, 0x02, 0x00, 0x00]))  # CONNACK accepted
+                first = False
+
+    def accept_loop():
+        while True:
+            conn, _ = server.accept()
+            threading.Thread(target=serve_client, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def run_benchmark(client: str, port: int, lights, frames: int):
+    controller = ZigbeeLightController('127.0.0.1', port, client=client)
+    controller.connect()
+
+    results = {}
+    for mode in ('per_publish', 'frame'):
+        start = time.perf_counter()
+        for i in range(frames):
+            hue = i % 360
+            if mode == 'frame':
+                controller.all_lights(lights, controller.set_color_hue, hue, 100, 200, 0.1)
+            else:
+                for light in lights:
+                    controller.set_color_hue(light, hue, 100, 200, 0.1)
+        elapsed = time.perf_counter() - start
+        results[mode] = elapsed / frames * 1e6
+
+    controller.disconnect()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame publish overhead benchmark")
+    parser.add_argument('--lights', type=int, default=20, help="Lights per frame")
+    parser.add_argument('--frames', type=int, default=2000, help="Frames per measurement")
+    args = parser.parse_args()
+
+    port = start_sink_broker()
+    lights = [f"bulb_{i}" for i in range(args.lights)]
+
+    clients = ['lite']
+    if mqtt is not None:
+        clients.insert(0, 'paho')
+    else:
+        print("  ⚠ paho-mqtt not installed, benchmarking the built-in client only")
+
+    print(f"\n  {args.lights} lights, {args.frames} frames\n")
+    print(f"  {'client':<8} {'per publish':>14} {'frame':>14} {'speedup':>9}")
+    for client in clients:
+        results = run_benchmark(client, port, lights, args.frames)
+        speedup = results['per_publish'] / results['frame']
+        print(f"  {client:<8} {results['per_publish']:>11.1f} µs {results['frame']:>11.1f} µs {speedup:>8.2f}x")
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -7,14 +7,34 @@ Controls Zigbee color bulbs using gamepad input
 import sys
 import json
 import time
+import signal
 import threading
 from pathlib import Path
 from evdev import InputDevice, categorize, ecodes
-from zigbee_light_controller import ZigbeeLightController
+from light_router import create_light_controller
+from light_control_server import ControlServer
+from adaptive_rate import AdaptiveRateController
+from profiler import RuntimeProfiler
+from analog_processing import AnalogProcessor
+from session_state import SessionStateFile
+from macros import compile_macro, MacroPlayer
 
 
 class GamepadLightController:
-    def __init__(self, config_path='gamepad_config.json', presets_path='color_presets.json'):
+    # Input handlers and effect frames timed by the stall detector while profiling
+    PROFILED_METHODS = ['handle_button', 'handle_dpad', 'handle_analog', 'dispatch_action', '_rainbow_frame']
+
+    def __init__(self, config_path='gamepad_config.json', presets_path='color_presets.json',
+                 gamepad=None, light_controller=None):
+        """
+        Args:
+            config_path: Controller configuration
+            presets_path: Color presets
+            gamepad: Input device to use instead of searching /dev/input
+                     (anything with read_loop(), e.g. a synthetic device)
+            light_controller: Light controller to use instead of the one
+                              described by the config
+        """
         # Load configuration
         with open(config_path, 'r') as f:
             self.config = json.load(f)
@@ -23,11 +43,12 @@ class GamepadLightController:
             self.presets_data = json.load(f)
 
         # Initialize gamepad
-        self.gamepad = None
-        self.init_gamepad()
+        self.gamepad = gamepad
+        if self.gamepad is None:
+            self.init_gamepad()
 
         # Initialize light controller
-        self.light_controller = ZigbeeLightController()
+        self.light_controller = light_controller or create_light_controller(self.config)
         self.light_controller.connect()
 
         # Discover lights
@@ -64,12 +85,74 @@ class GamepadLightController:
             'ABS_RX': 128, 'ABS_RY': 128
         }
 
+        # Stick deadzones, response curves and motion prediction
+        stick_pairs = [(stick['x_axis'], stick['y_axis'])
+                       for stick in self.config['analog_stick_mappings'].values()]
+        self.analog_processor = AnalogProcessor(
+            self.config['behavior'].get('analog_processing', {}),
+            stick_pairs,
+            self.config['behavior']['analog_deadzone']
+        )
+
+        # Adaptive update rate (driven by measured Zigbee round trips)
+        self.rate_controller = None
+        adaptive_config = self.config['behavior'].get('adaptive_rate', {})
+        if adaptive_config.get('enabled', False):
+            self.rate_controller = AdaptiveRateController(
+                adaptive_config,
+                self.config['behavior']['analog_update_throttle_ms']
+            )
+            self.light_controller.attach_rate_controller(self.rate_controller)
+
         # Running flag
         self.running = True
 
         # Rainbow thread
         self.rainbow_thread = None
 
+        # Zones (named groups of lights, None = all lights)
+        self.zones = self.config.get('zones', {})
+        self.current_zone = None
+
+        # Serializes actions coming from the gamepad and the control server
+        self.action_lock = threading.RLock()
+
+        # Trailing stick updates: once an axis has been quiet for a throttle
+        # interval, its unpredicted position is sent (the last update sent was
+        # either a prediction or was dropped by the throttle)
+        self.analog_pending = {}  # axis -> time of its last event
+        self.analog_settled = {}  # axis -> event time its resting position was sent for
+        self.analog_sent = {}     # axis -> last value sent
+        threading.Thread(target=self._analog_settle_loop, name="analog-settle", daemon=True).start()
+
+        # Macros (compiled once at load, played with monotonic timing)
+        self.pressed_buttons = set()
+        self.macro_player = MacroPlayer(self.action_lock)
+        self.macros = {}
+        for name, definition in self.config.get('macros', {}).items():
+            try:
+                self.macros[name] = compile_macro(name, definition, self)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"  ✗ Macro '{name}' skipped: {e}")
+
+        # Persistent session state (resumed after a restart or crash)
+        self.session_state = None
+        session_config = self.config.get('session_state', {})
+        if session_config.get('enabled', False):
+            self.session_state = SessionStateFile(session_config.get('path', 'gamepad_state.bin'))
+            self._resume_session(session_config.get('resume_timeout', 1.0))
+
+        # On-demand profiler (SIGUSR1 or the 'profile' control command)
+        self.profiler = RuntimeProfiler(self, self.PROFILED_METHODS, self.config.get('profiling', {}))
+        signal.signal(signal.SIGUSR1, self._on_profile_signal)
+
+        # Local control server (UDP / WebSocket)
+        self.control_server = None
+        server_config = self.config.get('control_server', {})
+        if server_config.get('enabled', False):
+            self.control_server = ControlServer(self, server_config)
+            self.control_server.start()
+
         print(f"\n✓ Initialized with preset: {self.current_preset}")
         self.print_help()
 
@@ -194,11 +277,28 @@ class GamepadLightController:
                 return preset
         return None
 
+    def target_lights(self):
+        """Get lights addressed by actions (current zone, or all lights)"""
+        if self.current_zone is None:
+            return self.lights
+        return [light for light in self.zones[self.current_zone] if light in self.lights]
+
+    def select_zone(self, zone):
+        """Select the zone that following actions apply to ('all' for every light)"""
+        zone = str(zone)
+        if zone == 'all':
+            self.current_zone = None
+            print("  🗺  Zone: ALL")
+            return
+        if zone not in self.zones:
+            raise ValueError(f"unknown zone: {zone}")
+        self.current_zone = zone
+        print(f"  🗺  Zone: {zone} ({len(self.target_lights())} light(s))")
+
     def set_direct_color(self, color_name):
         """Set lights to a direct color"""
         if color_name not in self.presets_data['direct_colors']:
-            print(f"  ✗ Unknown color: {color_name}")
-            return
+            raise ValueError(f"unknown color: {color_name}")
 
         color = self.presets_data['direct_colors'][color_name]
         self.current_hue = color['hue']
@@ -211,14 +311,34 @@ class GamepadLightController:
             print(f"     [SIM] Hue={self.current_hue}, Sat={self.current_saturation}, Bright={self.current_brightness}")
             return
 
-        for light in self.lights:
-            self.light_controller.set_color_hue(
-                light,
-                self.current_hue,
-                self.current_saturation,
-                self.current_brightness,
-                self.current_transition
-            )
+        self.light_controller.all_lights(
+            self.target_lights(),
+            self.light_controller.set_color_hue,
+            self.current_hue,
+            self.current_saturation,
+            self.current_brightness,
+            self.current_transition
+        )
+
+    def set_color_hsv(self, hue, saturation, brightness=None):
+        """Set lights to an explicit hue/saturation/brightness"""
+        self.current_hue = int(hue) % 360
+        self.current_saturation = max(0, min(100, int(saturation)))
+        if brightness is not None:
+            self.current_brightness = max(0, min(254, int(brightness)))
+
+        if self.simulation_mode:
+            print(f"     [SIM] Hue={self.current_hue}, Sat={self.current_saturation}, Bright={self.current_brightness}")
+            return
+
+        self.light_controller.all_lights(
+            self.target_lights(),
+            self.light_controller.set_color_hue,
+            self.current_hue,
+            self.current_saturation,
+            self.current_brightness,
+            self.current_transition
+        )
 
     def next_preset(self):
         """Cycle to next color preset"""
@@ -232,6 +352,14 @@ class GamepadLightController:
         self.current_preset = self.presets_list[self.current_preset_index]
         self.apply_current_preset()
 
+    def set_preset(self, preset_name):
+        """Jump to a preset by name"""
+        if preset_name not in self.presets_list:
+            raise ValueError(f"preset '{preset_name}' not in cycle order")
+        self.current_preset_index = self.presets_list.index(preset_name)
+        self.current_preset = preset_name
+        self.apply_current_preset()
+
     def apply_current_preset(self):
         """Apply the current preset to lights"""
         preset = self.get_preset(self.current_preset)
@@ -255,14 +383,14 @@ class GamepadLightController:
                 print(f"     [SIM] {color['name'].upper()}: Hue={self.current_hue}, Sat={self.current_saturation}")
                 return
 
-            for light in self.lights:
-                self.light_controller.set_color_hue(
-                    light,
-                    self.current_hue,
-                    self.current_saturation,
-                    self.current_brightness,
-                    self.current_transition
-                )
+            self.light_controller.all_lights(
+                self.target_lights(),
+                self.light_controller.set_color_hue,
+                self.current_hue,
+                self.current_saturation,
+                self.current_brightness,
+                self.current_transition
+            )
 
     def increase_brightness(self, amount=25):
         """Increase brightness"""
@@ -287,8 +415,7 @@ class GamepadLightController:
         if self.simulation_mode:
             return
 
-        for light in self.lights:
-            self.light_controller.set_brightness(light, self.current_brightness, self.current_transition)
+        self.light_controller.all_lights(self.target_lights(), self.light_controller.set_brightness, self.current_brightness, self.current_transition)
 
     def toggle_lights(self):
         """Toggle lights on/off"""
@@ -297,13 +424,11 @@ class GamepadLightController:
         if self.lights_on:
             print("  💡 Lights: ON")
             if not self.simulation_mode:
-                for light in self.lights:
-                    self.light_controller.turn_on(light)
+                self.light_controller.all_lights(self.target_lights(), self.light_controller.turn_on)
         else:
             print("  💡 Lights: OFF")
             if not self.simulation_mode:
-                for light in self.lights:
-                    self.light_controller.turn_off(light)
+                self.light_controller.all_lights(self.target_lights(), self.light_controller.turn_off)
 
     def reset_to_white(self):
         """Reset all lights to warm white"""
@@ -315,8 +440,7 @@ class GamepadLightController:
         if self.simulation_mode:
             return
 
-        for light in self.lights:
-            self.light_controller.set_color_hue(light, 40, 20, 254, 1.0)
+        self.light_controller.all_lights(self.target_lights(), self.light_controller.set_color_hue, 40, 20, 254, 1.0)
 
     def increase_effect_speed(self):
         """Increase effect speed (decrease transition time)"""
@@ -356,57 +480,297 @@ class GamepadLightController:
         while self.rainbow_mode and self.running:
             self.current_hue = hue
 
-            if not self.simulation_mode:
-                for light in self.lights:
-                    self.light_controller.set_color_hue(light, hue, 100, self.current_brightness, 0.5)
+            # Slow down (never speed up) when the mesh is congested
+            interval = 0.5
+            if self.rate_controller:
+                interval = max(interval, self.rate_controller.interval())
+
+            self._rainbow_frame(hue, interval)
 
             hue = (hue + 10) % 360
-            time.sleep(0.5)
+            time.sleep(interval)
+
+    def _rainbow_frame(self, hue, interval):
+        """Send one rainbow step"""
+        if not self.simulation_mode:
+            self.light_controller.all_lights(self.target_lights(), self.light_controller.set_color_hue, hue, 100, self.current_brightness, interval)
+
+    def run_macro(self, name):
+        """Start (or retrigger) a macro by name"""
+        if name not in self.macros:
+            raise ValueError(f"unknown macro: {name}")
+        self.macro_player.trigger(self.macros[name])
+
+    def apply_macro_state(self, state):
+        """Take over the colors and power state a macro left the lights in (no commands sent)"""
+        self.current_hue = state.get('hue', self.current_hue)
+        self.current_saturation = state.get('saturation', self.current_saturation)
+        self.current_brightness = state.get('brightness', self.current_brightness)
+        self.lights_on = state.get('lights_on', self.lights_on)
+        self._save_session()
+
+    def handle_macro_trigger(self, button_code):
+        """Run the macro whose button chord was just completed, returns True if one matched"""
+        matches = [macro for macro in self.macros.values()
+                   if button_code in macro.trigger and macro.trigger <= self.pressed_buttons]
+        if not matches:
+            return False
+
+        # Prefer the largest chord (e.g. L1+A over A alone)
+        self.macro_player.trigger(max(matches, key=lambda macro: len(macro.trigger)))
+        return True
+
+    def toggle_profiling(self):
+        """Start/stop the sampling profiler and stall detector"""
+        self.profiler.toggle()
+
+    def _on_profile_signal(self, signum, frame):
+        # Toggle off the signal handler so it cannot deadlock with the interrupted code
+        threading.Thread(target=self.toggle_profiling, daemon=True).start()
+
+    def get_status(self):
+        """Controller state and metrics (for the control server's status command)"""
+        status = {
+            'preset': self.current_preset,
+            'zone': self.current_zone,
+            'hue': self.current_hue,
+            'saturation': self.current_saturation,
+            'brightness': self.current_brightness,
+            'lights_on': self.lights_on,
+            'lights': len(self.lights)
+        }
+        if self.rate_controller:
+            status['rate'] = self.rate_controller.metrics()
+        status['connection'] = self.light_controller.health()
+        return status
+
+    def _session_snapshot(self):
+        """Current state in the layout stored by SessionStateFile"""
+        if self.rainbow_mode:
+            effect = 'rainbow'
+        elif self.strobe_mode:
+            effect = 'strobe'
+        else:
+            effect = 'none'
+        return {
+            'preset_index': self.current_preset_index,
+            'hue': self.current_hue,
+            'saturation': self.current_saturation,
+            'brightness': self.current_brightness,
+            'lights_on': self.lights_on,
+            'effect': effect,
+            'transition': self.current_transition,
+            'zone': self.current_zone
+        }
+
+    def _save_session(self):
+        if self.session_state:
+            self.session_state.save(self._session_snapshot())
+
+    def _resume_session(self, timeout):
+        """Restore the saved state, only sending to lights that do not show it already"""
+        state = self.session_state.load()
+        if state is None:
+            return
+
+        if 0 <= state['preset_index'] < len(self.presets_list):
+            self.current_preset_index = state['preset_index']
+            self.current_preset = self.presets_list[self.current_preset_index]
+        if state['zone'] in self.zones:
+            self.current_zone = state['zone']
+        self.current_hue = state['hue']
+        self.current_saturation = state['saturation']
+        self.current_brightness = state['brightness']
+        self.current_transition = state['transition']
+        self.lights_on = state['lights_on']
+        self.strobe_mode = state['effect'] == 'strobe'
+
+        print(f"✓ Resumed session: {self.current_preset}, Hue={self.current_hue}, "
+              f"Sat={self.current_saturation}, Bright={self.current_brightness}, "
+              f"{'ON' if self.lights_on else 'OFF'}, effect={state['effect']}")
+
+        if state['effect'] == 'rainbow':
+            self.rainbow_cycle()
+            return
+
+        if self.simulation_mode:
+            return
+
+        lights = self.target_lights()
+        states = self.light_controller.request_states(lights, timeout)
+        stale = [light for light in lights if not self._light_shows_state(states.get(light))]
+        if not stale:
+            print("  ✓ All lights already show the saved state")
+            return
+
+        print(f"  → Restoring {len(stale)}/{len(lights)} light(s)")
+        if self.lights_on:
+            self.light_controller.all_lights(
+                stale,
+                self.light_controller.set_color_hue,
+                self.current_hue,
+                self.current_saturation,
+                self.current_brightness,
+                self.current_transition
+            )
+        else:
+            self.light_controller.all_lights(stale, self.light_controller.turn_off)
+
+    def _light_shows_state(self, light_state):
+        """Check a reported light state against the current controller state"""
+        if not light_state:
+            return False
+        if not self.lights_on:
+            return light_state.get('state') == 'OFF'
+        if light_state.get('state') != 'ON':
+            return False
+        if abs(light_state.get('brightness', -100) - self.current_brightness) > 2:
+            return False
+        if self.current_saturation == 0:
+            return True
+
+        color = light_state.get('color') or {}
+        if 'hue' not in color or 'saturation' not in color:
+            return False
+        hue_diff = abs(color['hue'] - self.current_hue) % 360
+        return min(hue_diff, 360 - hue_diff) <= 3 and abs(color['saturation'] - self.current_saturation) <= 3
+
+    def _analog_transition(self):
+        """Transition time for analog stick updates"""
+        if self.rate_controller:
+            return self.rate_controller.transition()
+        return 0.2
+
+    def _prediction_lead(self):
+        """How far ahead to predict stick motion (measured mesh latency if known)"""
+        if self.rate_controller and self.rate_controller.srtt is not None:
+            return self.rate_controller.srtt
+        return None
+
+    def set_effect(self, effect):
+        """Switch to a named effect ('rainbow', 'strobe' or 'none')"""
+        if effect == 'rainbow':
+            if not self.rainbow_mode:
+                self.rainbow_cycle()
+        elif effect == 'strobe':
+            if not self.strobe_mode:
+                self.toggle_strobe_mode()
+        elif effect == 'none':
+            if self.rainbow_mode:
+                self.rainbow_cycle()
+            if self.strobe_mode:
+                self.toggle_strobe_mode()
+        else:
+            raise ValueError(f"unknown effect: {effect}")
 
-    def adjust_hue(self, value):
+    def adjust_hue(self, value, transition=None):
         """Adjust hue from analog stick"""
         # Map 0-255 to 0-360
         self.current_hue = int((value / 255.0) * 360)
+        if transition is None:
+            transition = self._analog_transition()
 
         if not self.simulation_mode:
-            for light in self.lights:
-                self.light_controller.set_color_hue(
-                    light,
-                    self.current_hue,
-                    self.current_saturation,
-                    self.current_brightness,
-                    0.2
-                )
-
-    def adjust_saturation(self, value):
+            self.light_controller.all_lights(
+                self.target_lights(),
+                self.light_controller.set_color_hue,
+                self.current_hue,
+                self.current_saturation,
+                self.current_brightness,
+                transition
+            )
+
+    def adjust_saturation(self, value, transition=None):
         """Adjust saturation from analog stick (inverted)"""
         # Map 0-255 to 100-0 (inverted Y-axis)
         self.current_saturation = int(100 - (value / 255.0) * 100)
+        if transition is None:
+            transition = self._analog_transition()
 
         if not self.simulation_mode:
-            for light in self.lights:
-                self.light_controller.set_color_hue(
-                    light,
-                    self.current_hue,
-                    self.current_saturation,
-                    self.current_brightness,
-                    0.2
-                )
-
-    def adjust_brightness_analog(self, value):
+            self.light_controller.all_lights(
+                self.target_lights(),
+                self.light_controller.set_color_hue,
+                self.current_hue,
+                self.current_saturation,
+                self.current_brightness,
+                transition
+            )
+
+    def adjust_brightness_analog(self, value, transition=None):
         """Adjust brightness from analog stick (inverted)"""
         # Map 0-255 to 254-0 (inverted Y-axis)
         self.current_brightness = int(254 - (value / 255.0) * 254)
+        if transition is None:
+            transition = self._analog_transition()
 
         if not self.simulation_mode:
-            for light in self.lights:
-                self.light_controller.set_brightness(light, self.current_brightness, 0.2)
+            self.light_controller.all_lights(self.target_lights(), self.light_controller.set_brightness, self.current_brightness, transition)
 
     def adjust_transition_speed(self, value):
         """Adjust transition speed from analog stick"""
         # Map 0-255 to 0.0-2.0
         self.current_transition = (value / 255.0) * 2.0
 
+    def dispatch_action(self, action, params=None):
+        """
+        Execute a named action
+
+        Shared by gamepad buttons, the D-pad and the control server, so every
+        input source goes through the same path. Returns False for unknown
+        actions and raises ValueError for unknown colors, presets, zones,
+        effects or macros.
+        """
+        params = params or {}
+
+        with self.action_lock:
+            if action == 'set_direct_color':
+                self.set_direct_color(params['color'])
+            elif action == 'set_color_hsv':
+                self.set_color_hsv(params['hue'], params['saturation'], params.get('brightness'))
+            elif action == 'next_preset':
+                self.next_preset()
+            elif action == 'previous_preset':
+                self.previous_preset()
+            elif action == 'set_preset':
+                self.set_preset(params['preset'])
+            elif action == 'select_zone':
+                self.select_zone(params['zone'])
+            elif action == 'set_effect':
+                self.set_effect(params['effect'])
+            elif action == 'toggle_lights':
+                self.toggle_lights()
+            elif action == 'reset_to_white':
+                self.reset_to_white()
+            elif action == 'increase_effect_speed':
+                self.increase_effect_speed()
+            elif action == 'decrease_effect_speed':
+                self.decrease_effect_speed()
+            elif action == 'toggle_strobe_mode':
+                self.toggle_strobe_mode()
+            elif action == 'rainbow_cycle':
+                self.rainbow_cycle()
+            elif action == 'increase_brightness':
+                self.increase_brightness(params.get('amount', 25))
+            elif action == 'decrease_brightness':
+                self.decrease_brightness(params.get('amount', 25))
+            elif action == 'set_brightness':
+                self.set_brightness(params['value'])
+            elif action == 'run_macro':
+                self.run_macro(params['macro'])
+            elif action == 'toggle_profiling':
+                self.toggle_profiling()
+            elif action == 'quit':
+                print("\n  👋 Exiting gamepad controller...")
+                self.running = False
+            else:
+                print(f"  ✗ Unknown action: {action}")
+                return False
+
+            self._save_session()
+
+        return True
+
     def handle_button(self, button_code, button_name):
         """Handle button press events"""
         button_code_str = str(button_code)
@@ -419,28 +783,7 @@ class GamepadLightController:
 
         print(f"  🎮 {mapping['name']}: {mapping['description']}")
 
-        # Execute action
-        if action == 'set_direct_color':
-            self.set_direct_color(mapping['color'])
-        elif action == 'next_preset':
-            self.next_preset()
-        elif action == 'previous_preset':
-            self.previous_preset()
-        elif action == 'toggle_lights':
-            self.toggle_lights()
-        elif action == 'reset_to_white':
-            self.reset_to_white()
-        elif action == 'increase_effect_speed':
-            self.increase_effect_speed()
-        elif action == 'decrease_effect_speed':
-            self.decrease_effect_speed()
-        elif action == 'toggle_strobe_mode':
-            self.toggle_strobe_mode()
-        elif action == 'rainbow_cycle':
-            self.rainbow_cycle()
-        elif action == 'quit':
-            print("\n  👋 Exiting gamepad controller...")
-            self.running = False
+        self._dispatch_mapping(action, mapping)
 
     def handle_dpad(self, axis_name, value):
         """Handle D-pad events"""
@@ -456,49 +799,79 @@ class GamepadLightController:
 
         print(f"  🎮 {mapping['name']}: {mapping['description']}")
 
-        if action == 'increase_brightness':
-            self.increase_brightness(mapping['amount'])
-        elif action == 'decrease_brightness':
-            self.decrease_brightness(mapping['amount'])
-        elif action == 'set_brightness':
-            self.set_brightness(mapping['value'])
+        self._dispatch_mapping(action, mapping)
 
-    def handle_analog(self, axis_name, value):
-        """Handle analog stick movements with deadzone and throttling"""
-        # Apply deadzone
-        deadzone = self.config['behavior']['analog_deadzone']
-        center = 128
-
-        if abs(value - center) < deadzone:
-            value = center
+    def _dispatch_mapping(self, action, mapping):
+        """Run the action of a button or D-pad mapping, reporting bad mappings"""
+        try:
+            self.dispatch_action(action, mapping)
+        except ValueError as e:
+            print(f"  ✗ {e}")
 
-        # Store value
+    def handle_analog(self, axis_name, value):
+        """Handle analog stick movements with deadzone, response curve, prediction and throttling"""
+        # Store raw value and feed the deadzone / curve / predictor stage
         self.analog_values[axis_name] = value
+        self.analog_processor.update(axis_name, value, time.monotonic())
+
+        self.analog_pending[axis_name] = time.monotonic()
 
         # Throttle updates
         now = time.time() * 1000
-        throttle = self.config['behavior']['analog_update_throttle_ms']
-
-        if now - self.last_analog_update < throttle:
+        if now - self.last_analog_update < self._analog_throttle_ms():
             return
 
         self.last_analog_update = now
 
+        # Send where the stick will be once the bulbs respond
+        value = self.analog_processor.value(axis_name, self._prediction_lead())
+        transition = self.analog_processor.transition(axis_name, self._analog_transition())
+        self._apply_analog(axis_name, value, transition)
+
+    def _analog_throttle_ms(self):
+        if self.rate_controller:
+            return self.rate_controller.interval_ms()
+        return self.config['behavior']['analog_update_throttle_ms']
+
+    def _analog_settle_loop(self):
+        """Send the resting position of axes that stopped moving"""
+        while self.running:
+            time.sleep(0.02)
+            now = time.monotonic()
+            settle_delay = self._analog_throttle_ms() / 1000.0
+            for axis_name, last_event in list(self.analog_pending.items()):
+                if now - last_event < settle_delay or self.analog_settled.get(axis_name) == last_event:
+                    continue
+                self.analog_settled[axis_name] = last_event
+                value = self.analog_processor.value(axis_name, 0.0)
+                if value != self.analog_sent.get(axis_name):
+                    self._apply_analog(axis_name, value, self._analog_transition())
+
+    def _apply_analog(self, axis_name, value, transition):
+        """Apply a processed stick value to its axis action"""
+        self.analog_sent[axis_name] = value
+
         # Handle based on axis
-        if axis_name == 'ABS_X':
-            self.adjust_hue(value)
-        elif axis_name == 'ABS_Y':
-            self.adjust_saturation(value)
-        elif axis_name == 'ABS_RX':
-            self.adjust_transition_speed(value)
-        elif axis_name == 'ABS_RY':
-            self.adjust_brightness_analog(value)
+        with self.action_lock:
+            if axis_name == 'ABS_X':
+                self.adjust_hue(value, transition)
+            elif axis_name == 'ABS_Y':
+                self.adjust_saturation(value, transition)
+            elif axis_name == 'ABS_RX':
+                self.adjust_transition_speed(value)
+            elif axis_name == 'ABS_RY':
+                self.adjust_brightness_analog(value, transition)
+
+            self._save_session()
 
     def run(self):
         """Main event loop"""
         print("\n🎮 Gamepad controller is running...")
         print("   Press Home/Guide button to quit\n")
 
+        # Only a deliberate quit resets the lights; after a crash they keep
+        # their state so a restart can resume it without a flash
+        reset_lights = False
         try:
             for event in self.gamepad.read_loop():
                 if not self.running:
@@ -506,8 +879,12 @@ class GamepadLightController:
 
                 # Button events
                 if event.type == ecodes.EV_KEY:
-                    if event.value == 1:  # Button press (not release)
-                        self.handle_button(event.code, ecodes.BTN[event.code] if event.code in ecodes.BTN else f"BTN_{event.code}")
+                    if event.value == 1:  # Button press
+                        self.pressed_buttons.add(event.code)
+                        if not self.handle_macro_trigger(event.code):
+                            self.handle_button(event.code, ecodes.BTN[event.code] if event.code in ecodes.BTN else f"BTN_{event.code}")
+                    elif event.value == 0:  # Button release
+                        self.pressed_buttons.discard(event.code)
 
                 # Absolute axis events (D-pad and analog sticks)
                 elif event.type == ecodes.EV_ABS:
@@ -521,27 +898,46 @@ class GamepadLightController:
                     else:
                         self.handle_analog(axis_name, event.value)
 
+            reset_lights = True
+
         except KeyboardInterrupt:
             print("\n  ⚠ Interrupted by user (Ctrl+C)")
+            reset_lights = True
 
         finally:
-            self.cleanup()
+            self.cleanup(reset_lights)
 
-    def cleanup(self):
-        """Clean up resources"""
+    def cleanup(self, reset_lights: bool = True):
+        """Clean up resources (reset_lights applies behavior.shutdown_reset)"""
         print("\n→ Cleaning up...")
 
         self.rainbow_mode = False
         self.running = False
+        self.macro_player.cancel()
 
-        # Reset lights to white
-        if not self.simulation_mode:
-            print("  → Resetting lights to white...")
-            for light in self.lights:
-                self.light_controller.set_color_hue(light, 40, 20, 254, 1.0)
+        if self.control_server:
+            self.control_server.stop()
+
+        self.profiler.stop()
+
+        # Reset lights ('white', 'off' or 'none' to leave them as they are)
+        shutdown_reset = self.config['behavior'].get('shutdown_reset', 'white')
+        try:
+            if not reset_lights:
+                print("  → Leaving lights as they are (controller did not quit normally)")
+            elif not self.simulation_mode:
+                if shutdown_reset == 'white':
+                    print("  → Resetting lights to white...")
+                    self.light_controller.all_lights(self.lights, self.light_controller.set_color_hue, 40, 20, 254, 1.0)
+                elif shutdown_reset == 'off':
+                    print("  → Turning lights off...")
+                    self.light_controller.all_lights(self.lights, self.light_controller.turn_off)
+        finally:
+            if self.session_state:
+                self.session_state.close()
 
-        # Disconnect
-        self.light_controller.disconnect()
+            # Disconnect
+            self.light_controller.disconnect()
 
         print("  ✓ Gamepad controller stopped\n")
 
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Light Control Server
+Local low-latency control API (UDP datagrams and WebSocket) for the
+gamepad light controller. Commands go through the same action dispatch
+as the gamepad buttons.
+
+Protocol (one command per datagram / WebSocket text frame):
+    color <name>                 direct color from color_presets.json
+    hsv <hue> <sat> [<bri>]      explicit color (0-360, 0-100, 0-254)
+    preset <name|next|prev>      select color preset
+    zone <name|all>              select zone for following commands
+    effect <rainbow|strobe|none> switch effect
+    brightness <0-254>           set brightness
+    toggle                       toggle lights on/off
+    white                        reset to warm white
+    macro <name>                 run (or retrigger) a macro
+    action <name> [key=value..]  any action from gamepad_config.json
+    status                       controller state and metrics as JSON
+    profile                      toggle the sampling profiler
+
+Every command is answered with "OK" (status: "OK <json>") or "ERR <reason>".
+"""
+
+import base64
+import hashlib
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Actions that must not be triggered from the network
+REMOTE_BLOCKED_ACTIONS = {'quit'}
+
+
+class RateLimiter:
+    """Token bucket rate limiter keyed by client"""
+
+    def __init__(self, rate_per_sec: float, burst: int, max_clients: int = 256):
+        self.rate = float(rate_per_sec)
+        self.burst = float(burst)
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def allow(self, client) -> bool:
+        """Take one token for client, return False if the client is over its limit"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, last = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self.buckets[client] = (tokens, now)
+
+            # Forget least recently seen clients
+            while len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+
+        return allowed
+
+
+# Parameters of gamepad actions that must be integers
+INTEGER_PARAMS = {'hue', 'saturation', 'brightness', 'value'}
+
+
+def parse_command(line: str) -> Tuple[str, Dict]:
+    """
+    Parse a text command into an (action, params) pair for dispatch_action
+
+    Raises:
+        ValueError: if the command is malformed
+    """
+    parts = line.strip().split()
+    if not parts:
+        raise ValueError("empty command")
+
+    verb = parts[0].lower()
+    args = parts[1:]
+
+    if verb == 'color' and len(args) == 1:
+        return 'set_direct_color', {'color': args[0].lower()}
+    if verb == 'hsv' and len(args) in (2, 3):
+        params = {'hue': int(args[0]), 'saturation': int(args[1])}
+        if len(args) == 3:
+            params['brightness'] = int(args[2])
+        return 'set_color_hsv', params
+    if verb == 'preset' and len(args) == 1:
+        if args[0].lower() == 'next':
+            return 'next_preset', {}
+        if args[0].lower() in ('prev', 'previous'):
+            return 'previous_preset', {}
+        return 'set_preset', {'preset': args[0]}
+    if verb == 'zone' and len(args) == 1:
+        return 'select_zone', {'zone': args[0]}
+    if verb == 'effect' and len(args) == 1:
+        return 'set_effect', {'effect': args[0].lower()}
+    if verb == 'brightness' and len(args) == 1:
+        return 'set_brightness', {'value': int(args[0])}
+    if verb == 'toggle' and not args:
+        return 'toggle_lights', {}
+    if verb == 'white' and not args:
+        return 'reset_to_white', {}
+    if verb == 'macro' and len(args) == 1:
+        return 'run_macro', {'macro': args[0]}
+    if verb == 'status' and not args:
+        return 'status', {}
+    if verb == 'profile' and not args:
+        return 'toggle_profiling', {}
+    if verb == 'action' and args:
+        params = {}
+        for arg in args[1:]:
+            key, _, value = arg.partition('=')
+            if value.lstrip('-').isdigit():
+                params[key] = int(value)
+            elif key in INTEGER_PARAMS:
+                raise ValueError(f"bad parameter: {key}={value}")
+            else:
+                params[key] = value
+        return args[0], params
+
+    raise ValueError(f"bad command: {verb}")
+
+
+class _UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        reply = self.server.control.handle_command(data, self.client_address)
+        sock.sendto(reply.encode(), self.client_address)
+
+
+class _WebSocketHandler(socketserver.StreamRequestHandler):
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        if not self._handshake():
+            return
+
+        client = self.client_address
+        message = b''
+        while True:
+            frame = self._read_frame()
+            if frame is None:
+                return
+            fin, opcode, payload = frame
+
+            if opcode == 0x8:  # Close
+                self._send_frame(0x8, payload[:2])
+                return
+            if opcode == 0x9:  # Ping
+                self._send_frame(0xA, payload)
+                continue
+            if opcode in (0x1, 0x0):  # Text / continuation
+                message += payload
+                if len(message) > self.server.control.max_message_size:
+                    return
+                if fin:
+                    reply = self.server.control.handle_command(message, client)
+                    self._send_frame(0x1, reply.encode())
+                    message = b''
+
+    def _handshake(self) -> bool:
+        """Answer the HTTP upgrade request"""
+        key = None
+        request_line = self.rfile.readline(4096)
+        if not request_line:
+            return False
+        while True:
+            line = self.rfile.readline(4096).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            if name.strip().lower() == 'sec-websocket-key':
+                key = value.strip()
+
+        if key is None:
+            self.wfile.write(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+            return False
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.wfile.write((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        return True
+
+    def _read_exact(self, size: int) -> Optional[bytes]:
+        data = self.rfile.read(size)
+        if len(data) < size:
+            return None
+        return data
+
+    def _read_frame(self):
+        """Read one frame, returns (fin, opcode, payload) or None on EOF"""
+        header = self._read_exact(2)
+        if header is None:
+            return None
+        fin = bool(header[0] & 0x80)
+        opcode = header[0] & 0x0F
+        masked = bool(header[1] & 0x80)
+        length = header[1] & 0x7F
+
+        if length == 126:
+            extended = self._read_exact(2)
+            if extended is None:
+                return None
+            length = struct.unpack('!H', extended)[0]
+        elif length == 127:
+            extended = self._read_exact(8)
+            if extended is None:
+                return None
+            length = struct.unpack('!Q', extended)[0]
+
+        if length > self.server.control.max_message_size:
+            return None
+
+        mask = self._read_exact(4) if masked else None
+        payload = self._read_exact(length) if length else b''
+        if payload is None or (masked and mask is None):
+            return None
+
+        if mask:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+        return fin, opcode, payload
+
+    def _send_frame(self, opcode: int, payload: bytes):
+        header = bytes([0x80 | opcode])
+        if len(payload) < 126:
+            header += bytes([len(payload)])
+        elif len(payload) < 65536:
+            header += bytes([126]) + struct.pack('!H', len(payload))
+        else:
+            header += bytes([127]) + struct.pack('!Q', len(payload))
+        try:
+            self.wfile.write(header + payload)
+        except OSError:
+            pass
+
+
+class _UDPServer(socketserver.UDPServer):
+    # Datagrams are handled serially so commands keep their send order
+    allow_reuse_address = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ControlServer:
+    """UDP + WebSocket control server feeding GamepadLightController.dispatch_action"""
+
+    def __init__(self, controller, config: Dict):
+        self.controller = controller
+        self.host = config.get('host', '127.0.0.1')
+        self.udp_port = config.get('udp_port', 8765)
+        self.websocket_port = config.get('websocket_port', 8766)
+        self.max_message_size = config.get('max_message_size', 1024)
+        self.rate_limiter = RateLimiter(
+            config.get('rate_limit_per_sec', 50),
+            config.get('rate_limit_burst', 20)
+        )
+        self.servers = []
+        self.threads = []
+
+    def start(self):
+        """Start UDP and WebSocket listeners in background threads"""
+        if self.udp_port:
+            udp_server = _UDPServer((self.host, self.udp_port), _UDPHandler)
+            udp_server.max_packet_size = self.max_message_size
+            self.servers.append(udp_server)
+            print(f"✓ Control server listening on udp://{self.host}:{self.udp_port}")
+
+        if self.websocket_port:
+            ws_server = _ThreadingTCPServer((self.host, self.websocket_port), _WebSocketHandler)
+            self.servers.append(ws_server)
+            print(f"✓ Control server listening on ws://{self.host}:{self.websocket_port}")
+
+        for server in self.servers:
+            server.control = self
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def handle_command(self, data: bytes, client) -> str:
+        """Rate limit, parse and dispatch one command, returning the reply text"""
+        if not self.rate_limiter.allow(client):
+            return "ERR rate limited"
+
+        try:
+            action, params = parse_command(data.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError) as e:
+            return f"ERR {e}"
+
+        if action in REMOTE_BLOCKED_ACTIONS:
+            return f"ERR action not allowed: {action}"
+
+        if action == 'status':
+            return "OK " + json.dumps(self.controller.get_status())
+
+        try:
+            if not self.controller.dispatch_action(action, params):
+                return f"ERR unknown action: {action}"
+        except KeyError as e:
+            return f"ERR missing parameter: {e.args[0]}"
+        except ValueError as e:
+            return f"ERR {e}"
+        except TypeError:
+            return "ERR bad parameter"
+
+        return "OK"
+
+    def stop(self):
+        """Stop all listeners"""
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+        self.threads = []
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Light Daemon
+Owns the single MQTT connection to Zigbee2MQTT and serves light commands
+to local clients (gamepad controller, music show, ...) over a Unix domain
+socket, so the mesh sees one coherent command stream.
+
+Arbitration is per light: a client with a lease keeps a light until the
+lease runs out, and only clients with equal or higher priority can take it
+over. When a lease expires, the light is handed back to the highest
+priority remaining client by replaying that client's last command for it.
+
+Usage:
+    python3 light_daemon.py [--config gamepad_config.json] [--socket PATH]
+"""
+
+import argparse
+import itertools
+import json
+import os
+import signal
+import socketserver
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from light_router import create_light_controller
+from light_daemon_client import (
+    HEADER, COUNTS, COMMANDS,
+    OP_HELLO, OP_LIST, OP_STATES, OP_RELEASE,
+    STATUS_OK, STATUS_DENIED, STATUS_ERROR,
+    encode_message, decode_lights, decode_args
+)
+
+
+class _Client:
+    """Connection state of one daemon client"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(_Client._ids)
+        self.name = f"client{self.id}"
+        self.priority = 0
+        self.lease = 0.0
+
+
+class _ClientHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        client = _Client()
+        buffer = b''
+
+        try:
+            while True:
+                data = self.request.recv(65536)
+                if not data:
+                    return
+                buffer += data
+
+                # Answer every complete message in the buffer with one write
+                replies = []
+                while len(buffer) >= HEADER.size:
+                    length, opcode = HEADER.unpack_from(buffer)
+                    if len(buffer) < HEADER.size + length:
+                        break
+                    body = buffer[HEADER.size:HEADER.size + length]
+                    buffer = buffer[HEADER.size + length:]
+                    replies.append(daemon.handle_message(client, opcode, body))
+                if replies:
+                    self.request.sendall(b''.join(replies))
+        except OSError:
+            pass
+        finally:
+            daemon.client_gone(client)
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class LightDaemon:
+    """Shared light controller with per-light priority/lease arbitration"""
+
+    def __init__(self, config: Dict, socket_path: str):
+        self.socket_path = socket_path
+        self.light_controller = create_light_controller(config, use_daemon=False)
+        self.lights = []
+        self.light_set = set()
+        self.clients = {}  # client id -> name, for logging
+        self.leases = {}   # light -> [client id, priority, expiry]
+        self.shadows = {}  # light -> {client id: (priority, method name, args)}
+        self.lock = threading.RLock()
+        self.running = False
+        self.server = None
+
+    def start(self):
+        """Connect to the broker(s), discover lights and start serving"""
+        self.light_controller.connect()
+        print("→ Discovering Zigbee lights...")
+        self.lights = self.light_controller.discover_lights()
+        self.light_set = set(self.lights)
+
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.server = _UnixServer(self.socket_path, _ClientHandler)
+        self.server.daemon = self
+        os.chmod(self.socket_path, 0o660)
+
+        self.running = True
+        threading.Thread(target=self._expiry_loop, name="lease-expiry", daemon=True).start()
+        print(f"✓ Light daemon serving {len(self.lights)} light(s) on {self.socket_path}")
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.running = False
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self.light_controller.disconnect()
+
+    def handle_message(self, client: _Client, opcode: int, body: bytes) -> bytes:
+        """Execute one client message and return the encoded reply"""
+        try:
+            if opcode == OP_HELLO:
+                client.priority, lease_ms = struct.unpack_from('!BI', body)
+                client.lease = lease_ms / 1000.0
+                client.name = body[5:].decode('utf-8') or client.name
+                self.clients[client.id] = client.name
+                print(f"  + {client.name} connected (priority {client.priority}, lease {lease_ms} ms)")
+                return encode_message(STATUS_OK)
+
+            if opcode == OP_LIST:
+                return encode_message(STATUS_OK, '\n'.join(self.lights).encode('utf-8'))
+
+            lights, offset = decode_lights(body)
+            lights = lights or self.lights
+
+            if opcode == OP_STATES:
+                timeout = struct.unpack_from('!H', body, offset)[0] / 1000.0
+                lights = [light for light in lights if light in self.light_set]
+                states = self.light_controller.request_states(lights, timeout)
+                return encode_message(STATUS_OK, json.dumps(states).encode('utf-8'))
+
+            if opcode == OP_RELEASE:
+                self.release(client, lights)
+                return encode_message(STATUS_OK)
+
+            if opcode in COMMANDS:
+                method_name = COMMANDS[opcode][0]
+                accepted, denied = self.execute(client, lights, method_name, decode_args(opcode, body[offset:]))
+                status = STATUS_DENIED if denied else STATUS_OK
+                return encode_message(status, COUNTS.pack(accepted, denied))
+
+            return encode_message(STATUS_ERROR, f"unknown opcode {opcode}".encode('utf-8'))
+        except (struct.error, IndexError, KeyError, UnicodeDecodeError, ValueError) as e:
+            return encode_message(STATUS_ERROR, f"malformed message: {e}".encode('utf-8'))
+
+    def execute(self, client: _Client, lights: List[str], method_name: str, args: tuple):
+        """Send a command to the lights the client may control, returns (accepted, denied)"""
+        now = time.monotonic()
+        allowed = []
+        with self.lock:
+            for light in lights:
+                if light not in self.light_set:
+                    continue
+                self.shadows.setdefault(light, {})[client.id] = (client.priority, method_name, args)
+                if self._acquire(light, client, now):
+                    allowed.append(light)
+
+            if allowed:
+                self.light_controller.all_lights(allowed, getattr(self.light_controller, method_name), *args)
+
+        return len(allowed), len(lights) - len(allowed)
+
+    def _acquire(self, light: str, client: _Client, now: float) -> bool:
+        lease = self.leases.get(light)
+        held_by_other = lease is not None and lease[0] != client.id and lease[2] > now
+
+        if held_by_other and client.priority < lease[1]:
+            return False
+
+        if client.lease > 0:
+            self.leases[light] = [client.id, client.priority, now + client.lease]
+        elif held_by_other:
+            del self.leases[light]
+        return True
+
+    def release(self, client: _Client, lights: List[str]):
+        """Drop the client's leases and hand the lights back"""
+        with self.lock:
+            for light in lights:
+                lease = self.leases.get(light)
+                if lease is not None and lease[0] == client.id:
+                    del self.leases[light]
+                    self._hand_back(light, client.id)
+
+    def client_gone(self, client: _Client):
+        """Forget a disconnected client and hand back its lights"""
+        with self.lock:
+            for light, shadows in self.shadows.items():
+                shadows.pop(client.id, None)
+            for light in [light for light, lease in self.leases.items() if lease[0] == client.id]:
+                del self.leases[light]
+                self._hand_back(light, client.id)
+        if self.clients.pop(client.id, None):
+            print(f"  - {client.name} disconnected")
+
+    def _hand_back(self, light: str, previous_owner: int):
+        """Replay the last command of the highest priority remaining client"""
+        shadows = self.shadows.get(light, {})
+        shadows.pop(previous_owner, None)
+        if not shadows:
+            return
+
+        _, method_name, args = max(shadows.values(), key=lambda shadow: shadow[0])
+        getattr(self.light_controller, method_name)(light, *args)
+
+    def _expiry_loop(self):
+        while self.running:
+            time.sleep(0.1)
+            now = time.monotonic()
+            with self.lock:
+                expired = [(light, lease[0]) for light, lease in self.leases.items() if lease[2] <= now]
+                if not expired:
+                    continue
+                with self.light_controller.frame():
+                    for light, owner in expired:
+                        del self.leases[light]
+                        self._hand_back(light, owner)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared Zigbee light daemon")
+    parser.add_argument('--config', default='gamepad_config.json', help="Config with mqtt/bridges/daemon sections")
+    parser.add_argument('--socket', help="Unix socket path (default: daemon.socket from config)")
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    socket_path = args.socket or config.get('daemon', {}).get('socket', '/run/zigbee-lights/daemon.sock')
+    daemon = LightDaemon(config, socket_path)
+    daemon.start()
+
+    def shutdown(signum, frame):
+        # shutdown() blocks until serve_forever returns, so call it off the main thread
+        threading.Thread(target=daemon.stop, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+
+    print("✓ Light daemon stopped")
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Light Daemon Client
+Thin client for light_daemon.py, speaking its binary protocol over a Unix
+domain socket. Offers the ZigbeeLightController interface, so the gamepad
+controller (or the music show) can use the shared daemon instead of its
+own MQTT connection.
+
+Protocol: every message is a header (body length u32, opcode u8) and a
+body. Commands start with a light list (count u16, then length-prefixed
+UTF-8 names; count 0 = all lights). Replies use the same header with a
+status byte in place of the opcode.
+"""
+
+import inspect
+import json
+import random
+import socket
+import struct
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from zigbee_light_controller import ZigbeeLightController
+
+HEADER = struct.Struct('!IB')
+COUNTS = struct.Struct('!HH')  # accepted, denied lights in command replies
+
+# Opcodes
+OP_HELLO = 0x01
+OP_LIST = 0x02
+OP_STATES = 0x03
+OP_RELEASE = 0x04
+OP_HSV = 0x10
+OP_RGB = 0x11
+OP_BRIGHTNESS = 0x12
+OP_ON = 0x13
+OP_OFF = 0x14
+OP_EFFECT = 0x15
+
+# Reply status
+STATUS_OK = 0
+STATUS_DENIED = 1
+STATUS_ERROR = 2
+
+# Command opcodes -> (ZigbeeLightController method, argument struct)
+COMMANDS = {
+    OP_HSV: ('set_color_hue', struct.Struct('!HBBH')),
+    OP_RGB: ('set_color_rgb', struct.Struct('!BBBBH')),
+    OP_BRIGHTNESS: ('set_brightness', struct.Struct('!BH')),
+    OP_ON: ('turn_on', None),
+    OP_OFF: ('turn_off', None),
+    OP_EFFECT: ('effect', None),
+}
+METHOD_OPCODES = {method: opcode for opcode, (method, _) in COMMANDS.items()}
+FIELD_LIMITS = {'B': 0xFF, 'H': 0xFFFF}
+
+
+def encode_message(opcode: int, body: bytes = b'') -> bytes:
+    return HEADER.pack(len(body), opcode) + body
+
+
+def encode_lights(lights: List[str]) -> bytes:
+    parts = [struct.pack('!H', len(lights))]
+    for light in lights:
+        name = light.encode('utf-8')
+        parts.append(bytes([len(name)]) + name)
+    return b''.join(parts)
+
+
+def decode_lights(body: bytes) -> Tuple[List[str], int]:
+    """Decode a light list, returns (lights, offset of the data after it)"""
+    count = struct.unpack_from('!H', body)[0]
+    offset = 2
+    lights = []
+    for _ in range(count):
+        length = body[offset]
+        lights.append(body[offset + 1:offset + 1 + length].decode('utf-8'))
+        offset += 1 + length
+    return lights, offset
+
+
+def bind_args(method_name: str, args: tuple, kwargs: dict) -> tuple:
+    """Complete call arguments with the defaults of the ZigbeeLightController method"""
+    signature = inspect.signature(getattr(ZigbeeLightController, method_name))
+    bound = signature.bind(None, None, *args, **kwargs)  # self, light_name
+    bound.apply_defaults()
+    return bound.args[2:]
+
+
+def encode_args(opcode: int, args: tuple) -> bytes:
+    """Encode complete method arguments (transitions travel as milliseconds, up to 65.5 s)"""
+    if opcode == OP_EFFECT:
+        return args[0].encode('utf-8')
+    arg_struct = COMMANDS[opcode][1]
+    if arg_struct is None:
+        return b''
+    values = [int(value) for value in args[:-1]]
+    if opcode == OP_HSV:
+        values[0] %= 360
+    values.append(int(args[-1] * 1000))
+    # Clamp to the field sizes (u8 colors/brightness, u16 hue and transition ms)
+    limits = [FIELD_LIMITS[code] for code in arg_struct.format.lstrip('!')]
+    return arg_struct.pack(*(max(0, min(limit, value)) for value, limit in zip(values, limits)))
+
+
+def decode_args(opcode: int, data: bytes) -> tuple:
+    """Decode method arguments back into ZigbeeLightController call arguments"""
+    if opcode == OP_EFFECT:
+        return (data.decode('utf-8'),)
+    arg_struct = COMMANDS[opcode][1]
+    if arg_struct is None:
+        return ()
+    values = arg_struct.unpack(data[:arg_struct.size])
+    return values[:-1] + (values[-1] / 1000.0,)
+
+
+class LightDaemonClient:
+    """ZigbeeLightController-compatible client of the shared light daemon"""
+
+    def __init__(self, socket_path: str, name: str = 'client', priority: int = 0, lease_ms: int = 0,
+                 reconnect: Dict = None):
+        """
+        Args:
+            socket_path: Unix socket of the daemon
+            name: Client name (shown in the daemon log)
+            priority: 0-255, higher priority clients override lower ones
+            lease_ms: How long this client keeps lights after its last command
+            reconnect: Reconnect settings: {
+                'min_delay_ms': int (first retry delay, default 100),
+                'max_delay_ms': int (backoff limit, default 2000)
+            }
+        """
+        self.socket_path = socket_path
+        self.name = name
+        self.priority = priority
+        self.lease_ms = lease_ms
+        self.sock = None
+        self.connected = False
+        self.lock = threading.Lock()
+        self._frame_state = threading.local()
+
+        # Connection supervision (commands are dropped while the daemon is down)
+        reconnect = reconnect or {}
+        self.reconnect_min_delay = reconnect.get('min_delay_ms', 100) / 1000.0
+        self.reconnect_max_delay = reconnect.get('max_delay_ms', 2000) / 1000.0
+        self.reconnecting = False
+        self.disconnects = 0
+        self._stopping = False
+        self._wake = threading.Event()
+
+    def connect(self):
+        """
+        Connect to the daemon and register priority and lease
+
+        If the daemon is not running, connecting continues in the background.
+        """
+        self._stopping = False
+        self._wake.clear()
+        try:
+            self._open()
+            print(f"✓ Connected to light daemon at {self.socket_path} (priority {self.priority})")
+            return True
+        except OSError as e:
+            print(f"✗ Failed to connect to light daemon: {e}, retrying in background")
+            self._start_reconnect()
+            return False
+
+    def _open(self):
+        """Open the socket and send HELLO (raises OSError on failure)"""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            hello = struct.pack('!BI', self.priority, self.lease_ms) + self.name.encode('utf-8')
+            with self.lock:
+                sock.sendall(encode_message(OP_HELLO, hello))
+                self.sock = sock
+                self._read_reply()
+                self.connected = True
+        except (OSError, RuntimeError) as e:
+            sock.close()
+            self.sock = None
+            raise OSError(str(e)) from e
+
+    def _connection_lost(self, error: Exception):
+        """Drop the broken socket and reconnect in the background (called with lock held)"""
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if not self.connected:
+            return
+        self.connected = False
+        self.disconnects += 1
+        if not self._stopping:
+            print(f"  ⚠ Lost connection to light daemon ({error}), reconnecting...")
+            self._start_reconnect()
+
+    def _start_reconnect(self):
+        if self.reconnecting or self._stopping:
+            return
+        self.reconnecting = True
+        threading.Thread(target=self._reconnect_loop, name="daemon-reconnect", daemon=True).start()
+
+    def _reconnect_loop(self):
+        """Reconnect with jittered exponential backoff"""
+        delay = self.reconnect_min_delay
+        try:
+            while not self._stopping and not self.connected:
+                if self._wake.wait(delay * random.uniform(0.5, 1.5)):
+                    return
+                try:
+                    self._open()
+                    print(f"  ✓ Reconnected to light daemon at {self.socket_path}")
+                    return
+                except OSError:
+                    pass
+                delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            self.reconnecting = False
+
+    def discover_lights(self) -> List[str]:
+        """Get the lights known to the daemon (none if not connected)"""
+        if not self.connected:
+            return []
+        _, body = self._request(OP_LIST)
+        lights = body.decode('utf-8').split('\n') if body else []
+        print(f"\n  Daemon controls {len(lights)} lights")
+        return lights
+
+    def request_states(self, lights: List[str], timeout: float = 1.0) -> Dict[str, dict]:
+        _, body = self._request(OP_STATES, encode_lights(lights) + struct.pack('!H', int(timeout * 1000)))
+        return json.loads(body.decode('utf-8')) if body else {}
+
+    def release(self, lights: List[str] = None):
+        """Give up leases (all lights if none given)"""
+        self._request(OP_RELEASE, encode_lights(lights or []))
+
+    def set_color_hue(self, light_name: str, hue: int, saturation: int = 100, brightness: int = 254, transition: float = 0.0):
+        self._command('set_color_hue', [light_name], (hue, saturation, brightness, transition))
+
+    def set_color_rgb(self, light_name: str, r: int, g: int, b: int, brightness: int = 254, transition: float = 0.0):
+        self._command('set_color_rgb', [light_name], (r, g, b, brightness, transition))
+
+    def set_brightness(self, light_name: str, brightness: int, transition: float = 0.0):
+        self._command('set_brightness', [light_name], (brightness, transition))
+
+    def turn_on(self, light_name: str):
+        self._command('turn_on', [light_name], ())
+
+    def turn_off(self, light_name: str):
+        self._command('turn_off', [light_name], ())
+
+    def effect(self, light_name: str, effect: str):
+        self._command('effect', [light_name], (effect,))
+
+    def all_lights(self, lights: List[str], action: callable, *args, **kwargs):
+        """Apply action to all lights with a single daemon message"""
+        if not lights:
+            return  # An empty light list would address every light
+        method_name = getattr(action, '__name__', None)
+        if method_name in METHOD_OPCODES:
+            self._command(method_name, lights, bind_args(method_name, args, kwargs))
+        else:
+            for light in lights:
+                action(light, *args, **kwargs)
+
+    def begin_frame(self):
+        state = self._frame_state
+        depth = getattr(state, 'depth', 0)
+        if depth == 0:
+            state.messages = []
+        state.depth = depth + 1
+
+    def commit_frame(self):
+        state = self._frame_state
+        state.depth -= 1
+        if state.depth == 0:
+            messages = state.messages
+            state.messages = None
+            if messages:
+                self._send_many(messages)
+
+    @contextmanager
+    def frame(self):
+        """Send all commands inside the block in one write"""
+        self.begin_frame()
+        try:
+            yield
+        finally:
+            self.commit_frame()
+
+    def health(self) -> Dict:
+        """Connection health (the daemon supervises the MQTT connection)"""
+        return {'connected': self.connected}
+
+    def attach_rate_controller(self, rate_controller):
+        pass  # The daemon owns the MQTT connection and its round trips
+
+    def disconnect(self):
+        self._stopping = True
+        self._wake.set()
+        with self.lock:
+            if self.sock is not None:
+                self.sock.close()
+                self.sock = None
+            self.connected = False
+        print("✓ Disconnected from light daemon")
+
+    def _command(self, method_name: str, lights: List[str], args: tuple):
+        opcode = METHOD_OPCODES[method_name]
+        message = encode_message(opcode, encode_lights(lights) + encode_args(opcode, args))
+        messages = getattr(self._frame_state, 'messages', None)
+        if messages is not None:
+            messages.append(message)
+            return
+        self._send_many([message])
+
+    def _send_many(self, messages: List[bytes]):
+        """Send commands and read their replies (dropped while the daemon is down)"""
+        with self.lock:
+            if self.sock is None:
+                return
+            try:
+                self.sock.sendall(b''.join(messages))
+                for _ in messages:
+                    try:
+                        self._read_reply()
+                    except RuntimeError as e:
+                        print(f"  ✗ {e}")
+            except OSError as e:
+                self._connection_lost(e)
+
+    def _request(self, opcode: int, body: bytes = b''):
+        """Send one message and read its reply (empty OK reply if not connected)"""
+        with self.lock:
+            if self.sock is None:
+                return STATUS_OK, b''
+            try:
+                self.sock.sendall(encode_message(opcode, body))
+                return self._read_reply()
+            except OSError as e:
+                self._connection_lost(e)
+                return STATUS_OK, b''
+
+    def _read_reply(self):
+        header = self._read_exact(HEADER.size)
+        length, status = HEADER.unpack(header)
+        body = self._read_exact(length) if length else b''
+        if status == STATUS_ERROR:
+            raise RuntimeError(f"Light daemon error: {body.decode('utf-8', 'replace')}")
+        return status, body
+
+    def _read_exact(self, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Light daemon closed the connection")
+            data += chunk
+        return data
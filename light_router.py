@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Light Router
+Shards lights across several Zigbee2MQTT bridges (broker + base topic)
+behind the ZigbeeLightController interface
+"""
+
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+from zigbee_light_controller import ZigbeeLightController
+from light_daemon_client import LightDaemonClient
+
+
+class _BridgeWorker:
+    """Publishes command batches for one bridge on its own thread"""
+
+    def __init__(self, name: str, controller: ZigbeeLightController):
+        self.name = name
+        self.controller = controller
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name=f"bridge-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, method_name: str, lights: List[str], args, kwargs, done: threading.Semaphore):
+        self.jobs.put((method_name, lights, args, kwargs, done))
+
+    def stop(self):
+        self.jobs.put(None)
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            method_name, lights, args, kwargs, done = job
+            try:
+                self.controller.all_lights(lights, getattr(self.controller, method_name), *args, **kwargs)
+            except Exception as e:
+                print(f"  ✗ Bridge '{self.name}' failed to publish: {e}")
+            finally:
+                done.release()
+
+
+class LightRouter:
+    """
+    Routes commands to the bridge that owns each light
+
+    Each bridge gets its own ZigbeeLightController (and MQTT connection).
+    all_lights() fans a command out to every bridge in parallel, so one
+    logical command reaches all meshes at the same moment.
+    """
+
+    # Per-light commands that can be routed to a bridge
+    ROUTED_METHODS = ('set_color_hue', 'set_color_rgb', 'set_brightness', 'turn_on', 'turn_off', 'effect')
+
+    def __init__(self, bridges: List[Dict]):
+        """
+        Args:
+            bridges: List of bridge configs: {
+                'name': str,
+                'broker': str (default 'localhost'),
+                'port': int (default 1883),
+                'base_topic': str (default 'zigbee2mqtt'),
+                'client': str ('paho' or 'lite', default 'paho'),
+                'reconnect': dict (see ZigbeeLightController, optional),
+                'lights': [str] (optional, skips discovery for this bridge)
+            }
+        """
+        self.bridge_configs = {}
+        self.controllers = {}
+        for index, bridge in enumerate(bridges):
+            name = bridge.get('name', f"bridge{index}")
+            self.bridge_configs[name] = bridge
+            self.controllers[name] = ZigbeeLightController(
+                bridge.get('broker', 'localhost'),
+                bridge.get('port', 1883),
+                bridge.get('base_topic', 'zigbee2mqtt'),
+                bridge.get('client', 'paho'),
+                bridge.get('reconnect')
+            )
+
+        self.owners = {}  # light name -> bridge name
+        self.workers = {}
+        self.connected = False
+
+    def connect(self):
+        """
+        Connect to all bridges in parallel
+
+        Bridges that are not up yet keep connecting in the background (their
+        commands are journaled meanwhile), so every bridge gets a worker.
+        """
+        results = {}
+
+        def connect_bridge(name):
+            results[name] = self.controllers[name].connect()
+
+        self._run_parallel(connect_bridge)
+
+        for name, controller in self.controllers.items():
+            self.workers[name] = _BridgeWorker(name, controller)
+
+        self.connected = any(results.values())
+        connected = sum(1 for result in results.values() if result)
+        print(f"✓ Connected to {connected}/{len(self.controllers)} bridges")
+        return self.connected
+
+    def discover_lights(self) -> List[str]:
+        """
+        Discover color lights on all bridges and record which bridge owns each
+
+        Every bridge is asked again on each call, so lights of a bridge that
+        came online after connect() are picked up by the next discovery.
+        """
+        found = {}
+
+        def discover_bridge(name):
+            static_lights = self.bridge_configs[name].get('lights')
+            if static_lights is not None:
+                found[name] = list(static_lights)
+                self.controllers[name].subscribe_states(found[name])
+            else:
+                found[name] = self.controllers[name].discover_lights()
+
+        self._run_parallel(discover_bridge)
+
+        lights = []
+        for name in self.controllers:
+            for light in found.get(name, []):
+                if light in self.owners and self.owners[light] != name:
+                    print(f"  ⚠ Light '{light}' found on bridges '{self.owners[light]}' and '{name}', using '{self.owners[light]}'")
+                    continue
+                self.owners[light] = name
+                lights.append(light)
+
+        return lights
+
+    def attach_rate_controller(self, rate_controller):
+        """Share one AdaptiveRateController between all bridges"""
+        for controller in self.controllers.values():
+            controller.attach_rate_controller(rate_controller)
+
+    def request_states(self, lights: List[str], timeout: float = 1.0) -> Dict[str, dict]:
+        """Query light states on all bridges in parallel"""
+        groups = {}
+        for light in lights:
+            groups.setdefault(self.owners[light], []).append(light)
+
+        states = {}
+
+        def request_bridge(name):
+            if name in groups:
+                states.update(self.controllers[name].request_states(groups[name], timeout))
+
+        self._run_parallel(request_bridge)
+        return states
+
+    def health(self) -> Dict:
+        """Connection health of every bridge"""
+        bridges = {name: controller.health() for name, controller in self.controllers.items()}
+        return {
+            'connected': all(bridge['connected'] for bridge in bridges.values()),
+            'bridges': bridges
+        }
+
+    def bridge_for(self, light_name: str) -> ZigbeeLightController:
+        """Get the controller of the bridge that owns a light"""
+        return self.controllers[self.owners[light_name]]
+
+    def set_color_hue(self, light_name: str, *args, **kwargs):
+        self.bridge_for(light_name).set_color_hue(light_name, *args, **kwargs)
+
+    def set_color_rgb(self, light_name: str, *args, **kwargs):
+        self.bridge_for(light_name).set_color_rgb(light_name, *args, **kwargs)
+
+    def set_brightness(self, light_name: str, *args, **kwargs):
+        self.bridge_for(light_name).set_brightness(light_name, *args, **kwargs)
+
+    def turn_on(self, light_name: str):
+        self.bridge_for(light_name).turn_on(light_name)
+
+    def turn_off(self, light_name: str):
+        self.bridge_for(light_name).turn_off(light_name)
+
+    def effect(self, light_name: str, effect: str):
+        self.bridge_for(light_name).effect(light_name, effect)
+
+    def begin_frame(self):
+        for controller in self.controllers.values():
+            controller.begin_frame()
+
+    def commit_frame(self):
+        for controller in self.controllers.values():
+            controller.commit_frame()
+
+    @contextmanager
+    def frame(self):
+        """Batch the calling thread's publishes on every bridge (see ZigbeeLightController.frame)"""
+        self.begin_frame()
+        try:
+            yield
+        finally:
+            self.commit_frame()
+
+    def all_lights(self, lights: List[str], action: callable, *args, **kwargs):
+        """
+        Apply action to all lights, fanning out to the bridges in parallel
+
+        Returns once every bridge has published its share, so commands
+        keep their order per light.
+        """
+        method_name = getattr(action, '__name__', None)
+        if method_name not in self.ROUTED_METHODS:
+            for light in lights:
+                action(light, *args, **kwargs)
+            return
+
+        groups = {}
+        for light in lights:
+            groups.setdefault(self.owners[light], []).append(light)
+
+        if len(groups) == 1:
+            name, group = next(iter(groups.items()))
+            self.controllers[name].all_lights(group, getattr(self.controllers[name], method_name), *args, **kwargs)
+            return
+
+        done = threading.Semaphore(0)
+        submitted = 0
+        for name, group in groups.items():
+            worker = self.workers.get(name)
+            if worker is None:
+                self.controllers[name].all_lights(group, getattr(self.controllers[name], method_name), *args, **kwargs)
+                continue
+            worker.submit(method_name, group, args, kwargs, done)
+            submitted += 1
+
+        for _ in range(submitted):
+            done.acquire()
+
+    def disconnect(self):
+        """Disconnect from all bridges"""
+        for worker in self.workers.values():
+            worker.stop()
+        self.workers = {}
+        for controller in self.controllers.values():
+            controller.disconnect()
+        self.connected = False
+
+    def _run_parallel(self, function):
+        threads = [threading.Thread(target=function, args=(name,)) for name in self.controllers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def create_light_controller(config: Dict, use_daemon: bool = True):
+    """
+    Create the light controller described by config
+
+    A LightDaemonClient if the shared daemon is enabled (and use_daemon),
+    a LightRouter if bridges are configured, else a single ZigbeeLightController.
+    """
+    daemon_config = config.get('daemon', {})
+    if use_daemon and daemon_config.get('enabled', False):
+        return LightDaemonClient(
+            daemon_config.get('socket', '/run/zigbee-lights/daemon.sock'),
+            daemon_config.get('client_name', 'gamepad'),
+            daemon_config.get('priority', 100),
+            daemon_config.get('lease_ms', 5000),
+            daemon_config.get('reconnect')
+        )
+
+    bridges = config.get('bridges')
+    if bridges:
+        return LightRouter(bridges)
+
+    mqtt_config = config.get('mqtt', {})
+    return ZigbeeLightController(
+        mqtt_config.get('broker', 'localhost'),
+        mqtt_config.get('port', 1883),
+        mqtt_config.get('base_topic', 'zigbee2mqtt'),
+        mqtt_config.get('client', 'paho'),
+        mqtt_config.get('reconnect')
+    )
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Gamepad Macros
+Compiles macro definitions from gamepad_config.json into flat, timestamped
+command programs and plays them with monotonic timing.
+
+Step types (each step starts when the previous one has finished):
+    {"flash": "red", "times": 3, "on": 0.15, "off": 0.15}
+    {"color": "blue", "transition": 1.0}
+    {"hsv": [240, 100, 200], "transition": 1.0}
+    {"preset": "Fire", "transition": 1.0}
+    {"brightness": 50, "transition": 4.0}
+    {"power": "on"} / {"power": "off"}
+    {"wait": 0.5}
+    {"action": "next_preset"}          (any gamepad action, extra keys are parameters)
+
+Light steps accept "zone" to address a zone. Without one they address the
+controller's target lights (current zone) at the time the step runs.
+"""
+
+import threading
+import time
+from typing import Dict, List, Tuple
+
+
+def _on_lights(lights_api, lights, method, *args):
+    """Run a light method on a light list, or on the lights a resolver returns now"""
+    if callable(lights):
+        lights = lights()
+    lights_api.all_lights(lights, method, *args)
+
+
+class MacroProgram:
+    """Compiled macro: (offset seconds, function, args) steps sorted by offset"""
+
+    def __init__(self, name: str, trigger: frozenset, retrigger: str, steps: List[Tuple[float, callable, tuple]]):
+        self.name = name
+        self.trigger = trigger
+        self.retrigger = retrigger
+        self.steps = steps
+        self.duration = steps[-1][0] if steps else 0.0
+
+
+def compile_macro(name: str, definition: Dict, controller) -> MacroProgram:
+    """
+    Compile a macro definition against a GamepadLightController
+
+    Colors, presets and explicit zones are resolved here, so playing the
+    program only calls light controller methods at their timestamps. Steps
+    without a zone follow controller.target_lights() while playing.
+
+    Raises:
+        ValueError: if the definition is invalid
+    """
+    lights_api = controller.light_controller
+    direct_colors = controller.presets_data['direct_colors']
+    steps = []
+    now = 0.0
+
+    # Controller state after the macro, applied with its last light step
+    state = {}
+
+    def lights_for(step):
+        zone = step.get('zone')
+        if zone is None:
+            return controller.target_lights  # Resolved when the step runs
+        zone = str(zone)
+        if zone not in controller.zones:
+            raise ValueError(f"unknown zone '{zone}'")
+        return [light for light in controller.zones[zone] if light in controller.lights]
+
+    def emit(offset, function, *args):
+        steps.append((offset, function, args))
+
+    def emit_color(offset, lights, hue, saturation, brightness, transition):
+        emit(offset, _on_lights, lights_api, lights, lights_api.set_color_hue, hue, saturation, brightness, transition)
+        state.update(hue=hue, saturation=saturation, brightness=brightness, lights_on=True)
+
+    for index, step in enumerate(definition.get('steps', [])):
+        transition = float(step.get('transition', 0.0))
+
+        if 'flash' in step:
+            color = direct_colors.get(step['flash'])
+            if color is None:
+                raise ValueError(f"step {index}: unknown color '{step['flash']}'")
+            lights = lights_for(step)
+            on_time = float(step.get('on', 0.15))
+            off_time = float(step.get('off', 0.15))
+            for _ in range(int(step.get('times', 1))):
+                emit_color(now, lights, color['hue'], color['saturation'], color.get('brightness', 254), 0.0)
+                emit(now + on_time, _on_lights, lights_api, lights, lights_api.turn_off)
+                now += on_time + off_time
+            state['lights_on'] = False  # A flash ends dark
+        elif 'color' in step:
+            color = direct_colors.get(step['color'])
+            if color is None:
+                raise ValueError(f"step {index}: unknown color '{step['color']}'")
+            emit_color(now, lights_for(step), color['hue'], color['saturation'], color.get('brightness', 254), transition)
+            now += transition
+        elif 'hsv' in step:
+            hue, saturation, brightness = step['hsv']
+            emit_color(now, lights_for(step), int(hue) % 360, max(0, min(100, int(saturation))),
+                       max(0, min(254, int(brightness))), transition)
+            now += transition
+        elif 'preset' in step:
+            preset = controller.get_preset(step['preset'])
+            if preset is None or 'E' not in preset['colors']:
+                raise ValueError(f"step {index}: unknown preset '{step['preset']}'")
+            color = preset['colors']['E']
+            emit_color(now, lights_for(step), color['hue'], color['saturation'],
+                       preset.get('default_brightness', 200), transition)
+            now += transition
+        elif 'brightness' in step:
+            brightness = max(0, min(254, int(step['brightness'])))
+            emit(now, _on_lights, lights_api, lights_for(step), lights_api.set_brightness, brightness, transition)
+            state.update(brightness=brightness, lights_on=brightness > 0)
+            now += transition
+        elif 'power' in step:
+            power_on = step['power'] == 'on'
+            method = lights_api.turn_on if power_on else lights_api.turn_off
+            emit(now, _on_lights, lights_api, lights_for(step), method)
+            state['lights_on'] = power_on
+        elif 'wait' in step:
+            now += float(step['wait'])
+        elif 'action' in step:
+            params = {key: value for key, value in step.items() if key != 'action'}
+            emit(now, controller.dispatch_action, step['action'], params)
+        else:
+            raise ValueError(f"step {index}: unknown step type {sorted(step)}")
+
+    if state:
+        emit(now, controller.apply_macro_state, state)
+
+    steps.sort(key=lambda compiled: compiled[0])
+
+    trigger = definition.get('trigger', [])
+    if isinstance(trigger, (str, int)):
+        trigger = [trigger]
+
+    retrigger = definition.get('retrigger', 'restart')
+    if retrigger not in ('restart', 'cancel'):
+        raise ValueError(f"retrigger must be 'restart' or 'cancel', not '{retrigger}'")
+
+    return MacroProgram(name, frozenset(int(code) for code in trigger), retrigger, steps)
+
+
+class MacroPlayer:
+    """Plays one macro program at a time on a background thread"""
+
+    def __init__(self, lock):
+        self.lock = lock  # Serializes macro steps with other input
+        self.current = None
+        self.cancel_event = None
+        self.thread = None
+
+    def trigger(self, program: MacroProgram):
+        """Start a macro; pressing a running macro again restarts or cancels it"""
+        running = self.is_running()
+        same = running and self.current is program
+        self.cancel()
+
+        if same and program.retrigger == 'cancel':
+            print(f"  ⏹  Macro cancelled: {program.name}")
+            return
+
+        print(f"  ▶  Macro: {program.name} ({program.duration:.1f}s)")
+        self.current = program
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._play, args=(program, self.cancel_event),
+                                       name=f"macro-{program.name}", daemon=True)
+        self.thread.start()
+
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        self.cancel_event = None
+        self.current = None
+
+    def _play(self, program: MacroProgram, cancel_event: threading.Event):
+        start = time.monotonic()
+        for offset, function, args in program.steps:
+            delay = start + offset - time.monotonic()
+            if delay > 0 and cancel_event.wait(delay):
+                return
+            with self.lock:
+                if cancel_event.is_set():
+                    return
+                try:
+                    function(*args)
+                except ValueError as e:
+                    print(f"  ✗ Macro '{program.name}': {e}")
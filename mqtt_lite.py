@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Slim MQTT 3.1.1 Client
+Minimal QoS 0 client with a paho-compatible surface (connect, loop_start,
+publish, subscribe, on_connect/on_message/on_disconnect) plus
+publish_many(), which writes a whole frame of messages to the socket in
+one buffered send.
+"""
+
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Iterable, Optional, Tuple
+
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+SUBSCRIBE = 0x82
+SUBACK = 0x90
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+
+def encode_remaining_length(length: int) -> bytes:
+    """Encode the MQTT variable length integer"""
+    encoded = bytearray()
+    while True:
+        digit = length % 128
+        length //= 128
+        if length:
+            digit |= 0x80
+        encoded.append(digit)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value) -> bytes:
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return struct.pack('!H', len(value)) + value
+
+
+def encode_publish(topic: str, payload, retain: bool = False) -> bytes:
+    """Encode a QoS 0 PUBLISH packet"""
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    elif payload is None:
+        payload = b''
+    body = encode_string(topic) + payload
+    header = PUBLISH | (0x01 if retain else 0x00)
+    return bytes([header]) + encode_remaining_length(len(body)) + body
+
+
+def encode_connect(client_id: str, keepalive: int) -> bytes:
+    """Encode a CONNECT packet (clean session, no credentials)"""
+    body = encode_string('MQTT') + bytes([0x04, 0x02]) + struct.pack('!H', keepalive) + encode_string(client_id)
+    return bytes([CONNECT]) + encode_remaining_length(len(body)) + body
+
+
+def encode_subscribe(packet_id: int, topic: str, qos: int = 0) -> bytes:
+    body = struct.pack('!H', packet_id) + encode_string(topic) + bytes([qos])
+    return bytes([SUBSCRIBE]) + encode_remaining_length(len(body)) + body
+
+
+class MQTTMessage:
+    """Received message (same attribute names as paho's MQTTMessage)"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'retain')
+
+    def __init__(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.retain = retain
+
+
+class LiteClient:
+    """Minimal threaded MQTT 3.1.1 client (QoS 0 publish, QoS 0/1 receive)"""
+
+    def __init__(self, client_id: Optional[str] = None):
+        self.client_id = client_id or f"zigbee-lights-{os.getpid()}-{int(time.time() * 1000) % 100000}"
+        self.keepalive = 60
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+
+        self._sock = None
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._packet_id = 0
+        self._last_write = 0.0
+        self._last_read = 0.0
+        self._ping_at = 0.0
+
+    def connect(self, host: str, port: int = 1883, keepalive: int = 60):
+        """Open the TCP connection and send CONNECT (CONNACK is handled by the loop)"""
+        self.keepalive = keepalive
+        sock = socket.create_connection((host, port), timeout=10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(1.0)
+        self._sock = sock
+        self._last_read = time.monotonic()
+        self._ping_at = 0.0
+        self._write(encode_connect(self.client_id, keepalive))
+
+    def socket(self):
+        return self._sock
+
+    def loop_start(self):
+        """Start the network thread (reads packets, sends keepalive pings)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="mqtt-lite", daemon=True)
+        self._thread.start()
+
+    def loop_stop(self):
+        self._running = False
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def disconnect(self):
+        try:
+            self._write(bytes([DISCONNECT, 0]))
+        except OSError:
+            pass
+        self._close()
+
+    def publish(self, topic: str, payload=None, qos: int = 0, retain: bool = False):
+        """Publish one message (QoS 0 only)"""
+        self._write(encode_publish(topic, payload, retain))
+
+    def publish_many(self, messages: Iterable[Tuple[str, object]]):
+        """Publish (topic, payload) pairs in order with a single socket write"""
+        self._write(b''.join(encode_publish(topic, payload) for topic, payload in messages))
+
+    def subscribe(self, topic: str, qos: int = 0):
+        self._packet_id = self._packet_id % 65535 + 1
+        self._write(encode_subscribe(self._packet_id, topic, qos))
+
+    def _write(self, data: bytes):
+        if self._sock is None:
+            raise OSError("not connected")
+        with self._write_lock:
+            self._sock.sendall(data)
+            self._last_write = time.monotonic()
+
+    def _close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _recv_exact(self, size: int) -> Optional[bytes]:
+        """
+        Read exactly size bytes, sending pings while idle
+
+        Returns None on EOF or stop, and when nothing (not even a PINGRESP)
+        has arrived for 1.5x keepalive, so half-open connections are closed.
+        """
+        data = b''
+        while len(data) < size:
+            sock = self._sock
+            if not self._running or sock is None:
+                return None
+            try:
+                chunk = sock.recv(size - len(data))
+            except socket.timeout:
+                if self.keepalive:
+                    now = time.monotonic()
+                    if now - self._last_read > self.keepalive * 1.5:
+                        return None
+                    idle = now - min(self._last_write, self._last_read)
+                    if idle > self.keepalive / 2 and self._ping_at <= self._last_read:
+                        self._ping_at = now
+                        self._write(bytes([PINGREQ, 0]))
+                continue
+            if not chunk:
+                return None
+            self._last_read = time.monotonic()
+            data += chunk
+        return data
+
+    def _read_packet(self):
+        header = self._recv_exact(1)
+        if header is None:
+            return None
+
+        length = 0
+        multiplier = 1
+        while True:
+            digit = self._recv_exact(1)
+            if digit is None:
+                return None
+            length += (digit[0] & 0x7F) * multiplier
+            if not digit[0] & 0x80:
+                break
+            multiplier *= 128
+
+        body = self._recv_exact(length) if length else b''
+        if body is None:
+            return None
+        return header[0], body
+
+    def _loop(self):
+        rc = 0
+        try:
+            while self._running:
+                packet = self._read_packet()
+                if packet is None:
+                    rc = 0 if not self._running else 1
+                    break
+                self._handle_packet(*packet)
+        except OSError:
+            rc = 1
+        finally:
+            if self._running:
+                self._close()
+            if self.on_disconnect:
+                self.on_disconnect(self, None, rc)
+
+    def _handle_packet(self, header: int, body: bytes):
+        packet_type = header & 0xF0
+
+        if packet_type == CONNACK:
+            if self.on_connect:
+                self.on_connect(self, None, {'session present': body[0] & 0x01}, body[1])
+        elif packet_type == PUBLISH:
+            qos = (header >> 1) & 0x03
+            topic_length = struct.unpack('!H', body[:2])[0]
+            topic = body[2:2 + topic_length].decode('utf-8')
+            offset = 2 + topic_length
+            if qos:
+                packet_id = body[offset:offset + 2]
+                offset += 2
+                self._write(bytes([PUBACK, 2]) + packet_id)
+            if self.on_message:
+                self.on_message(self, None, MQTTMessage(topic, body[offset:], qos, bool(header & 0x01)))
+        # SUBACK and PINGRESP need no handling (any packet counts as a sign of life)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Runtime Profiler
+On-demand sampling profiler (collapsed stacks for flamegraph.pl /
+speedscope) and a stall detector for input handlers and effect frames.
+Nothing is installed while profiling is off.
+"""
+
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from typing import Dict, List
+
+
+def _format_frame(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads at a fixed rate"""
+
+    def __init__(self, sample_hz: float = 100, output_path: str = 'profile.collapsed'):
+        self.interval = 1.0 / sample_hz
+        self.output_path = output_path
+        self.samples = Counter()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.samples = Counter()
+        self.running = True
+        self.thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> str:
+        """Stop sampling and write collapsed stacks, returns the output path"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+        with open(self.output_path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return self.output_path
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        next_sample = time.monotonic()
+        while self.running:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_format_frame(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[';'.join(reversed(stack))] += 1
+
+            next_sample += self.interval
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.monotonic()
+
+
+class StallDetector:
+    """
+    Times handler calls and reports the ones that exceed a threshold
+
+    install() wraps methods on one object instance. A watchdog thread
+    logs the live stack of any call still running past the threshold,
+    which shows where it is stuck. uninstall() restores the plain methods.
+    """
+
+    def __init__(self, threshold_ms: float = 50):
+        self.threshold = threshold_ms / 1000.0
+        self.in_flight = {}  # thread id -> [name, start, reported]
+        self.lock = threading.Lock()
+        self.running = False
+        self.watchdog = None
+        self.installed = []
+
+    def install(self, target, method_names: List[str]):
+        for name in method_names:
+            setattr(target, name, self._wrap(name, getattr(target, name)))
+            self.installed.append((target, name))
+
+        self.running = True
+        self.watchdog = threading.Thread(target=self._watch, name="stall-watchdog", daemon=True)
+        self.watchdog.start()
+
+    def uninstall(self):
+        self.running = False
+        if self.watchdog is not None:
+            self.watchdog.join()
+            self.watchdog = None
+
+        for target, name in self.installed:
+            # Drop the instance attribute so the class method is used again
+            delattr(target, name)
+        self.installed = []
+
+    def _wrap(self, name: str, method):
+        def timed(*args, **kwargs):
+            thread_id = threading.get_ident()
+            if thread_id in self.in_flight:
+                return method(*args, **kwargs)  # Nested call, timed by the outer one
+
+            entry = [name, time.perf_counter(), False]
+            with self.lock:
+                self.in_flight[thread_id] = entry
+            try:
+                return method(*args, **kwargs)
+            finally:
+                with self.lock:
+                    del self.in_flight[thread_id]
+                elapsed = time.perf_counter() - entry[1]
+                if elapsed > self.threshold:
+                    print(f"  ⚠ Stall: {name} took {elapsed * 1000:.1f} ms")
+
+        return timed
+
+    def _watch(self):
+        while self.running:
+            time.sleep(self.threshold / 2)
+            now = time.perf_counter()
+            with self.lock:
+                stalled = [(thread_id, entry) for thread_id, entry in self.in_flight.items()
+                           if not entry[2] and now - entry[1] > self.threshold]
+                for _, entry in stalled:
+                    entry[2] = True
+
+            frames = sys._current_frames()
+            for thread_id, (name, start, _) in stalled:
+                frame = frames.get(thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+                print(f"  ⚠ Stall: {name} running for {(now - start) * 1000:.1f} ms, stack:\n{stack}")
+
+
+class RuntimeProfiler:
+    """Toggles the sampling profiler and stall detector together (thread-safe)"""
+
+    def __init__(self, target, method_names: List[str], config: Dict):
+        self.target = target
+        self.method_names = method_names
+        self.config = config
+        self.sampler = None
+        self.stall_detector = None
+        self.lock = threading.Lock()  # SIGUSR1 and the control server can toggle at once
+
+    @property
+    def active(self) -> bool:
+        return self.sampler is not None
+
+    def start(self):
+        with self.lock:
+            self._start()
+
+    def stop(self):
+        with self.lock:
+            self._stop()
+
+    def toggle(self):
+        with self.lock:
+            if self.active:
+                self._stop()
+            else:
+                self._start()
+
+    def _start(self):
+        if self.active:
+            return
+        self.sampler = SamplingProfiler(
+            self.config.get('sample_hz', 100),
+            self.config.get('output', 'profile.collapsed')
+        )
+        self.stall_detector = StallDetector(self.config.get('stall_threshold_ms', 50))
+        self.stall_detector.install(self.target, self.method_names)
+        self.sampler.start()
+        print(f"  🔬 Profiling: ON ({self.config.get('sample_hz', 100)} Hz)")
+
+    def _stop(self):
+        if not self.active:
+            return
+        self.stall_detector.uninstall()
+        path = self.sampler.stop()
+        self.sampler = None
+        self.stall_detector = None
+        print(f"  🔬 Profiling: OFF (collapsed stacks written to {path})")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Session State File
+Crash-safe controller state in a small fixed-layout memory-mapped file.
+
+The file holds two slots that are written alternately, each with a
+sequence number and CRC. A write that is torn by a crash leaves the other
+slot intact. Writes go to the page cache through the mapping, so they
+survive a process crash without an fsync per change.
+"""
+
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Optional
+
+MAGIC = b'ZLCS'
+VERSION = 1
+
+# magic, version, sequence, preset index, hue, saturation, brightness,
+# lights on, effect, transition, zone name
+SLOT = struct.Struct('<4sHIhHBBBBf32s')
+CRC = struct.Struct('<I')
+SLOT_SIZE = 64
+FILE_SIZE = 2 * SLOT_SIZE
+
+EFFECTS = ['none', 'rainbow', 'strobe']
+
+
+class SessionStateFile:
+    """Persists controller state on every change"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sequence = 0
+        self.slot = 0
+        self.last_state = None
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != FILE_SIZE:
+                os.ftruncate(fd, FILE_SIZE)
+            self.map = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+
+    def load(self) -> Optional[Dict]:
+        """Read the newest valid slot, or None if there is no saved state"""
+        newest = None
+        for slot in range(2):
+            record = self._read_slot(slot)
+            if record is not None and (newest is None or record[0] > newest[0]):
+                newest = (record[0], slot, record[1])
+
+        if newest is None:
+            return None
+
+        self.sequence, self.slot, state = newest
+        self.last_state = state
+        return dict(state)
+
+    def _read_slot(self, slot: int):
+        offset = slot * SLOT_SIZE
+        data = self.map[offset:offset + SLOT.size]
+        crc = CRC.unpack_from(self.map, offset + SLOT.size)[0]
+        if zlib.crc32(data) != crc:
+            return None
+
+        (magic, version, sequence, preset_index, hue, saturation, brightness,
+         lights_on, effect, transition, zone) = SLOT.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            return None
+
+        zone = zone.rstrip(b'\0').decode('utf-8', 'replace')
+        return sequence, {
+            'preset_index': preset_index,
+            'hue': hue,
+            'saturation': saturation,
+            'brightness': brightness,
+            'lights_on': bool(lights_on),
+            'effect': EFFECTS[effect] if effect < len(EFFECTS) else 'none',
+            'transition': round(transition, 3),
+            'zone': zone or None
+        }
+
+    def save(self, state: Dict):
+        """Write state to the older slot (skipped if nothing changed)"""
+        if state == self.last_state:
+            return
+
+        self.sequence += 1
+        self.slot ^= 1
+        data = SLOT.pack(
+            MAGIC,
+            VERSION,
+            self.sequence,
+            state['preset_index'],
+            state['hue'] % 360,
+            max(0, min(100, state['saturation'])),
+            max(0, min(254, state['brightness'])),
+            1 if state['lights_on'] else 0,
+            EFFECTS.index(state['effect']),
+            state['transition'],
+            (state['zone'] or '').encode('utf-8')[:32]
+        )
+        offset = self.slot * SLOT_SIZE
+        self.map[offset:offset + SLOT.size] = data
+        CRC.pack_into(self.map, offset + SLOT.size, zlib.crc32(data))
+        self.last_state = dict(state)
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
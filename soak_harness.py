@@ -0,0 +1,565 @@
+#!/usr/bin/env python3
+"""
+Soak / Scale Harness
+Runs GamepadLightController against a local broker stand-in with any number
+of fake Zigbee2MQTT color lights, drives synthetic gamepad input, rainbow
+and macros for a configurable time, and samples resource usage:
+
+    RSS (/proc), traced memory and allocated blocks (tracemalloc), thread
+    count, command -> state echo round trip, and broker message backlog
+
+At the end, a least-squares trend is fitted to every metric (after the
+warmup) and the run fails (exit code 1) if any of them grows faster than
+its limit, so leaks and slowdowns that would take days to show up in
+production are caught in a shorter run. A trend only fails when it is
+above the limit by more than two standard errors, so noise in short runs
+reads as inconclusive (✓ with a wide ±) rather than as growth.
+
+Usage:
+    python3 soak_harness.py [--lights 200] [--duration 600] [--sample 10]
+                            [--client lite] [--echo-delay-ms 20] [--csv soak.csv]
+"""
+
+import argparse
+import collections
+import json
+import math
+import os
+import queue
+import random
+import socket
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from evdev import ecodes
+
+from mqtt_lite import CONNECT, PUBLISH, SUBSCRIBE, PINGREQ, DISCONNECT, encode_publish, encode_remaining_length
+from gamepad_light_controller import GamepadLightController
+
+HERE = Path(__file__).resolve().parent
+
+# Actions the synthetic gamepad never presses (rainbow is kept on by the harness)
+SKIPPED_ACTIONS = {'quit', 'toggle_profiling', 'rainbow_cycle'}
+
+# Played periodically when the config has no macros (no trigger, so the
+# synthetic button presses never start it)
+SOAK_MACROS = {
+    'soak_alert': {
+        'steps': [
+            {'flash': 'red', 'times': 3, 'on': 0.15, 'off': 0.15},
+            {'preset': 'Fire', 'transition': 1.0},
+            {'wait': 2.0},
+            {'brightness': 80, 'transition': 4.0}
+        ]
+    }
+}
+
+
+def topic_matches(topic_filter: str, topic: str) -> bool:
+    """MQTT topic filter match with + and # wildcards"""
+    filter_parts = topic_filter.split('/')
+    topic_parts = topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts) or (part != '+' and part != topic_parts[index]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+class _BrokerConnection:
+    """One client connection: reader thread plus a writer thread with an outgoing queue"""
+
+    def __init__(self, broker, sock):
+        self.broker = broker
+        self.sock = sock
+        self.subscriptions = set()  # Exact topics
+        self.wildcards = []         # Filters with + or #
+        self.outgoing = queue.Queue()
+
+    def start(self):
+        threading.Thread(target=self._read_loop, name="broker-read", daemon=True).start()
+        threading.Thread(target=self._write_loop, name="broker-write", daemon=True).start()
+
+    def wants(self, topic: str) -> bool:
+        return topic in self.subscriptions or any(topic_matches(topic_filter, topic) for topic_filter in self.wildcards)
+
+    def send(self, data: bytes):
+        self.outgoing.put(data)
+
+    def close(self):
+        self.outgoing.put(None)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _write_loop(self):
+        while True:
+            data = self.outgoing.get()
+            if data is None:
+                break
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                break
+        self.sock.close()
+
+    def _read_loop(self):
+        stream = self.sock.makefile('rb')
+        try:
+            while True:
+                header = stream.read(1)
+                if not header:
+                    break
+
+                length = 0
+                multiplier = 1
+                while True:
+                    digit = stream.read(1)
+                    if not digit:
+                        return
+                    length += (digit[0] & 0x7F) * multiplier
+                    if not digit[0] & 0x80:
+                        break
+                    multiplier *= 128
+                body = stream.read(length)
+
+                packet_type = header[0] & 0xF0
+                if packet_type == CONNECT:
+                    self.send(bytes([0x20, 0x02, 0x00, 0x00]))  # CONNACK accepted
+                elif packet_type == PUBLISH:
+                    topic_length = struct.unpack('!H', body[:2])[0]
+                    topic = body[2:2 + topic_length].decode('utf-8')
+                    offset = 2 + topic_length + (2 if header[0] & 0x06 else 0)
+                    self.broker.on_publish(topic, body[offset:])
+                elif packet_type == SUBSCRIBE & 0xF0:
+                    packet_id = body[:2]
+                    offset = 2
+                    granted = bytearray()
+                    while offset < len(body):
+                        topic_length = struct.unpack('!H', body[offset:offset + 2])[0]
+                        topic_filter = body[offset + 2:offset + 2 + topic_length].decode('utf-8')
+                        if '+' in topic_filter or '#' in topic_filter:
+                            self.wildcards.append(topic_filter)
+                        else:
+                            self.subscriptions.add(topic_filter)
+                        offset += 2 + topic_length + 1
+                        granted.append(0)
+                    reply = packet_id + bytes(granted)
+                    self.send(bytes([0x90]) + encode_remaining_length(len(reply)) + reply)
+                elif packet_type == PINGREQ:
+                    self.send(bytes([0xD0, 0x00]))
+                elif packet_type == DISCONNECT:
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            self.broker.connection_gone(self)
+            self.outgoing.put(None)
+
+
+class FakeBroker:
+    """
+    MQTT 3.1.1 broker stand-in with fake Zigbee2MQTT color lights
+
+    Routes QoS 0 publishes to subscribers, answers bridge/request/devices
+    with the fake device list, and echoes the merged state of a light after
+    a fixed mesh delay when it receives a set or get command.
+    """
+
+    def __init__(self, lights: List[str], base_topic: str = 'zigbee2mqtt', echo_delay_ms: float = 20):
+        self.lights = set(lights)
+        self.base_topic = base_topic
+        self.echo_delay = echo_delay_ms / 1000.0
+        self.states = {light: {'state': 'ON', 'brightness': 254, 'color': {'hue': 0, 'saturation': 0}}
+                       for light in lights}
+        self.devices = [{
+            'friendly_name': light,
+            'ieee_address': f"0x{index:016x}",
+            'type': 'Router',
+            'definition': {
+                'model': 'SOAK-RGB',
+                'vendor': 'Soak',
+                'description': 'Fake color light',
+                'exposes': [{'type': 'light', 'features': [{'name': 'color_hs'}]}]
+            }
+        } for index, light in enumerate(lights)]
+
+        self.connections = []
+        self.lock = threading.Lock()
+        self.received = 0
+        self.echoes = collections.deque()  # (due time, light)
+        self.echo_event = threading.Event()
+        self.server = None
+        self.port = None
+
+    def start(self) -> int:
+        """Listen on a free local port and return it"""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(8)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="broker-accept", daemon=True).start()
+        threading.Thread(target=self._echo_loop, name="broker-mesh", daemon=True).start()
+        return self.port
+
+    def stop(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.server.close()
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+    def backlog(self) -> int:
+        """Messages waiting in the mesh and in outgoing socket queues"""
+        with self.lock:
+            return len(self.echoes) + sum(connection.outgoing.qsize() for connection in self.connections)
+
+    def connection_gone(self, connection: _BrokerConnection):
+        with self.lock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+
+    def on_publish(self, topic: str, payload: bytes):
+        with self.lock:
+            self.received += 1
+
+        base = self.base_topic + '/'
+        if topic == base + 'bridge/request/devices':
+            self.publish(base + 'bridge/devices', json.dumps(self.devices))
+        elif topic.startswith(base) and topic.endswith(('/set', '/get')):
+            light = topic[len(base):-4]
+            if light in self.lights:
+                if topic.endswith('/set'):
+                    self._apply(light, payload)
+                with self.lock:
+                    self.echoes.append((time.monotonic() + self.echo_delay, light))
+                self.echo_event.set()
+
+        self.publish(topic, payload)
+
+    def publish(self, topic: str, payload):
+        """Send a message to every matching subscriber"""
+        packet = encode_publish(topic, payload)
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            if connection.wants(topic):
+                connection.send(packet)
+
+    def _apply(self, light: str, payload: bytes):
+        try:
+            command = json.loads(payload.decode('utf-8'))
+        except ValueError:
+            return
+        state = self.states[light]
+        for key in ('state', 'brightness', 'color'):
+            if key in command:
+                state[key] = command[key]
+        if 'brightness' in command or 'color' in command:
+            state['state'] = 'ON'
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, _ = self.server.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = _BrokerConnection(self, sock)
+            with self.lock:
+                self.connections.append(connection)
+            # Only read once registered, or early replies (bridge/devices) have no subscriber
+            connection.start()
+
+    def _echo_loop(self):
+        """Publish state echoes once their mesh delay has passed"""
+        while True:
+            self.echo_event.clear()
+            with self.lock:
+                due, light = self.echoes[0] if self.echoes else (None, None)
+            if due is None:
+                self.echo_event.wait(0.5)
+                continue
+
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            with self.lock:
+                self.echoes.popleft()
+            self.publish(f"{self.base_topic}/{light}", json.dumps(self.states[light]))
+
+
+class _Event:
+    __slots__ = ('type', 'code', 'value')
+
+    def __init__(self, event_type: int, code: int, value: int):
+        self.type = event_type
+        self.code = code
+        self.value = value
+
+
+class SyntheticGamepad:
+    """
+    Input device stand-in: sweeps both sticks continuously and presses a
+    random mapped button or D-pad direction every press_interval seconds
+    """
+
+    name = 'Synthetic soak gamepad'
+
+    def __init__(self, config: Dict, stop_event: threading.Event, stick_hz: float = 60.0,
+                 press_interval: float = 2.0, seed: int = 1):
+        self.stop_event = stop_event
+        self.stick_period = 1.0 / stick_hz
+        self.press_interval = press_interval
+        self.random = random.Random(seed)
+
+        self.buttons = [int(code) for code, mapping in config['button_mappings'].items()
+                        if mapping['action'] not in SKIPPED_ACTIONS]
+        self.dpad = [(ecodes.ecodes[axis], int(value))
+                     for axis, values in config['dpad_mappings'].items()
+                     for value in values]
+        self.axes = [ecodes.ecodes[stick[axis]]
+                     for stick in config['analog_stick_mappings'].values()
+                     for axis in ('x_axis', 'y_axis')]
+
+    def read_loop(self):
+        phase = 0.0
+        next_press = time.monotonic() + self.press_interval
+        while not self.stop_event.is_set():
+            # Slow sweep through the whole stick range, one axis after another
+            phase += self.stick_period
+            for index, axis in enumerate(self.axes):
+                position = (phase / 8.0 + index / len(self.axes)) % 1.0
+                yield _Event(ecodes.EV_ABS, axis, int(255 * abs(2 * position - 1)))
+
+            if time.monotonic() >= next_press:
+                next_press += self.press_interval
+                if self.dpad and self.random.random() < 0.3:
+                    axis, value = self.random.choice(self.dpad)
+                    yield _Event(ecodes.EV_ABS, axis, value)
+                    yield _Event(ecodes.EV_ABS, axis, 0)
+                elif self.buttons:
+                    code = self.random.choice(self.buttons)
+                    yield _Event(ecodes.EV_KEY, code, 1)
+                    yield _Event(ecodes.EV_KEY, code, 0)
+
+            self.stop_event.wait(self.stick_period)
+
+
+def read_rss_kb() -> int:
+    with open('/proc/self/status', 'r') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+
+def trend_per_hour(times: List[float], values: List[float]) -> Tuple[float, float]:
+    """Least-squares slope of values over time and its standard error, per hour"""
+    count = len(times)
+    mean_t = sum(times) / count
+    mean_v = sum(values) / count
+    variance = sum((t - mean_t) ** 2 for t in times)
+    if variance == 0:
+        return 0.0, 0.0
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / variance
+    residuals = sum((v - mean_v - slope * (t - mean_t)) ** 2 for t, v in zip(times, values))
+    stderr = math.sqrt(residuals / max(count - 2, 1) / variance)
+    return slope * 3600.0, stderr * 3600.0
+
+
+def soak_config(args, port: int, state_path: str) -> Dict:
+    """Controller config for the run: fake broker, no daemon, no network servers"""
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    config['mqtt'] = dict(config.get('mqtt', {}), broker='127.0.0.1', port=port, client=args.client)
+    config['bridges'] = []
+    config['daemon'] = {'enabled': False}
+    config['control_server'] = dict(config.get('control_server', {}), enabled=False)
+    config['session_state'] = {'enabled': True, 'path': state_path, 'resume_timeout': 0.5}
+    config['macros'] = config.get('macros') or SOAK_MACROS
+    config['behavior']['shutdown_reset'] = 'none'
+    adaptive = config['behavior'].setdefault('adaptive_rate', {})
+    adaptive['enabled'] = True  # Measures the command -> echo round trip
+    return config
+
+
+def take_sample(elapsed: float, controller, broker: FakeBroker) -> Dict:
+    # Leave out what the harness itself allocates (samples, snapshots)
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__)
+    ])
+    stats = snapshot.statistics('filename')
+    rate = controller.rate_controller.metrics() if controller.rate_controller else {}
+    health = controller.light_controller.health()
+    return {
+        'elapsed': elapsed,
+        'rss_kb': read_rss_kb(),
+        'traced_kb': sum(stat.size for stat in stats) / 1024.0,
+        'blocks': sum(stat.count for stat in stats),
+        'threads': threading.active_count(),
+        'rtt_ms': rate.get('srtt_ms') or 0.0,
+        'backlog': broker.backlog() + rate.get('pending', 0) + health.get('journal', 0),
+        'received': broker.received,
+        'snapshot': snapshot
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak and scale test for the gamepad light controller")
+    parser.add_argument('--lights', type=int, default=200, help="Number of fake lights")
+    parser.add_argument('--duration', type=float, default=600, help="Run time in seconds")
+    parser.add_argument('--sample', type=float, default=10, help="Seconds between samples")
+    parser.add_argument('--warmup', type=float, default=300, help="Seconds excluded from trend checks")
+    parser.add_argument('--client', choices=['paho', 'lite'], default='lite', help="MQTT client")
+    parser.add_argument('--echo-delay-ms', type=float, default=20, help="Simulated mesh delay of state echoes")
+    parser.add_argument('--press-interval', type=float, default=2.0, help="Seconds between synthetic button presses")
+    parser.add_argument('--macro-interval', type=float, default=30.0, help="Seconds between macro runs (0 = off)")
+    parser.add_argument('--config', default=str(HERE / 'gamepad_config.json'), help="Base controller config")
+    parser.add_argument('--log', default=os.devnull, help="File for the controller's console output")
+    parser.add_argument('--csv', help="Write samples to this CSV file")
+    parser.add_argument('--max-rss-kb-per-hour', type=float, default=4096)
+    parser.add_argument('--max-traced-kb-per-hour', type=float, default=1024)
+    parser.add_argument('--max-blocks-per-hour', type=float, default=5000)
+    parser.add_argument('--max-threads-per-hour', type=float, default=1)
+    parser.add_argument('--max-rtt-ms-per-hour', type=float, default=50)
+    parser.add_argument('--max-backlog-per-hour', type=float, default=200)
+    args = parser.parse_args()
+
+    # The controller prints every action; keep that out of the report
+    console = sys.stdout
+    log = open(args.log, 'w')
+
+    def report(message=''):
+        print(message, file=console, flush=True)
+
+    report(f"→ Soak run: {args.lights} lights, {args.duration:.0f} s, {args.client} client, "
+          f"{args.echo_delay_ms:.0f} ms mesh delay")
+
+    lights = [f"soak_light_{index:03d}" for index in range(args.lights)]
+    broker = FakeBroker(lights, echo_delay_ms=args.echo_delay_ms)
+    port = broker.start()
+
+    workdir = tempfile.TemporaryDirectory(prefix='soak-')
+    config_path = os.path.join(workdir.name, 'gamepad_config.json')
+    config = soak_config(args, port, os.path.join(workdir.name, 'gamepad_state.bin'))
+    with open(config_path, 'w') as f:
+        json.dump(config, f)
+
+    tracemalloc.start()
+    stop_event = threading.Event()
+    gamepad = SyntheticGamepad(config, stop_event, press_interval=args.press_interval)
+
+    sys.stdout = log
+    controller = GamepadLightController(config_path, str(HERE / 'color_presets.json'), gamepad=gamepad)
+    controller.dispatch_action('rainbow_cycle')
+
+    if len(controller.lights) != args.lights:
+        report(f"✗ Controller discovered {len(controller.lights)} of {args.lights} lights")
+        sys.exit(1)
+
+    runner = threading.Thread(target=controller.run, name="soak-controller", daemon=True)
+    runner.start()
+
+    samples = []
+    baseline = None  # First sample after warmup, its snapshot is kept for the allocation diff
+    start = time.monotonic()
+    next_macro = start + args.macro_interval
+    report(f"  {'time':>7} {'rss KB':>9} {'traced KB':>10} {'blocks':>9} {'threads':>7} {'rtt ms':>7} {'backlog':>7} {'msgs':>9}")
+    try:
+        while True:
+            elapsed = time.monotonic() - start
+            if args.macro_interval > 0 and time.monotonic() >= next_macro:
+                next_macro += args.macro_interval
+                for name in controller.macros:
+                    controller.dispatch_action('run_macro', {'macro': name})
+
+            if not samples or elapsed >= samples[-1]['elapsed'] + args.sample:
+                sample = take_sample(elapsed, controller, broker)
+                if samples and samples[-1] is not baseline:
+                    samples[-1]['snapshot'] = None
+                if baseline is None and elapsed >= args.warmup:
+                    baseline = sample
+                samples.append(sample)
+                report(f"  {elapsed:7.0f} {sample['rss_kb']:9d} {sample['traced_kb']:10.1f} {sample['blocks']:9d} "
+                      f"{sample['threads']:7d} {sample['rtt_ms']:7.1f} {sample['backlog']:7d} {sample['received']:9d}")
+
+            if elapsed >= args.duration or not runner.is_alive():
+                break
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        report("\n  ⚠ Interrupted, evaluating the samples so far")
+
+    stop_event.set()
+    runner.join(timeout=10)
+    broker.stop()
+    sys.stdout = console
+    log.close()
+    workdir.cleanup()
+
+    if args.csv:
+        columns = ['elapsed', 'rss_kb', 'traced_kb', 'blocks', 'threads', 'rtt_ms', 'backlog', 'received']
+        with open(args.csv, 'w') as f:
+            f.write(','.join(columns) + '\n')
+            for sample in samples:
+                f.write(','.join(str(sample[column]) for column in columns) + '\n')
+
+    sys.exit(evaluate(samples, args))
+
+
+def evaluate(samples: List[Dict], args) -> int:
+    """Print the trend report, returns the exit code"""
+    steady = [sample for sample in samples if sample['elapsed'] >= args.warmup]
+    if len(steady) < 3:
+        print(f"✗ Only {len(steady)} samples after the {args.warmup:.0f} s warmup, run longer or sample more often")
+        return 1
+
+    times = [sample['elapsed'] for sample in steady]
+    checks = [
+        ('RSS', 'rss_kb', 'KB', args.max_rss_kb_per_hour),
+        ('Traced memory', 'traced_kb', 'KB', args.max_traced_kb_per_hour),
+        ('Allocated blocks', 'blocks', '', args.max_blocks_per_hour),
+        ('Threads', 'threads', '', args.max_threads_per_hour),
+        ('Round trip', 'rtt_ms', 'ms', args.max_rtt_ms_per_hour),
+        ('Backlog', 'backlog', 'msgs', args.max_backlog_per_hour),
+    ]
+
+    print("\nTrends (per hour, after warmup):")
+    failed = False
+    for label, key, unit, limit in checks:
+        slope, stderr = trend_per_hour(times, [sample[key] for sample in steady])
+        ok = slope - 2 * stderr <= limit
+        failed |= not ok
+        print(f"  {'✓' if ok else '✗'} {label:<17} {slope:+12.1f} ±{2 * stderr:<10.1f} {unit:<4} (limit {limit:g})")
+
+    first = steady[0]
+    last = samples[-1]
+    if first is not last and first['snapshot'] is not None and last['snapshot'] is not None:
+        print("\nLargest allocation growth since warmup:")
+        for stat in last['snapshot'].compare_to(first['snapshot'], 'lineno')[:10]:
+            print(f"  {stat}")
+
+    duration = samples[-1]['elapsed']
+    print(f"\n  {samples[-1]['received']} messages in {duration:.0f} s "
+          f"({samples[-1]['received'] / max(duration, 1e-9):.0f}/s)")
+    print("✗ Soak run failed: growth above limits" if failed else "✓ Soak run passed")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    main()
@@ -4,60 +4,294 @@ Zigbee Light Controller
 Controls Zigbee color bulbs via MQTT (Zigbee2MQTT)
 """
 
-import paho.mqtt.client as mqtt
 import json
+import random
 import time
-from typing import List, Dict
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Tuple
+
+from mqtt_lite import LiteClient
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None  # Only the built-in client is available
+
+
+def merge_light_state(state: dict, payload: dict) -> dict:
+    """Merge a set payload into the accumulated set state of a light"""
+    merged = {key: value for key, value in state.items() if key != 'effect'}  # Effects are one-shot
+    if merged.get('state') == 'OFF' and ('brightness' in payload or 'color' in payload):
+        del merged['state']  # Color and brightness commands turn the light on
+    merged.update(payload)
+    return merged
+
 
 class ZigbeeLightController:
-    def __init__(self, mqtt_broker='localhost', mqtt_port=1883):
+    def __init__(self, mqtt_broker='localhost', mqtt_port=1883, base_topic='zigbee2mqtt', client='paho',
+                 reconnect: Dict = None):
+        """
+        Args:
+            mqtt_broker: Broker host
+            mqtt_port: Broker port
+            base_topic: Zigbee2MQTT base topic
+            client: 'paho' (paho-mqtt) or 'lite' (built-in MQTT 3.1.1 client
+                    that writes a whole frame with one socket send)
+            reconnect: Reconnect settings: {
+                'min_delay_ms': int (first retry delay, default 100),
+                'max_delay_ms': int (backoff limit, default 2000),
+                'resend_window_ms': int (commands sent this long before a
+                                         disconnect are resent, default 1000),
+                'journal_limit': int (lights kept in the offline journal, default 1000)
+            }
+        """
         self.broker = mqtt_broker
         self.port = mqtt_port
-        self.client = mqtt.Client()
+        self.base_topic = base_topic
+        if client == 'lite' or mqtt is None:
+            self.client = LiteClient()
+        else:
+            self.client = mqtt.Client()
         self.connected = False
         self.devices = []
 
+        # Connection supervision
+        reconnect = reconnect or {}
+        self.reconnect_min_delay = reconnect.get('min_delay_ms', 100) / 1000.0
+        self.reconnect_max_delay = reconnect.get('max_delay_ms', 2000) / 1000.0
+        self.resend_window = reconnect.get('resend_window_ms', 1000) / 1000.0
+        self.journal_limit = reconnect.get('journal_limit', 1000)
+        self.reconnecting = False
+        self.disconnects = 0
+        self.last_outage_ms = None
+        self._disconnected_at = None
+        self._stopping = False
+        self._connected_event = threading.Event()
+        self._wake = threading.Event()
+
+        # Offline journal: accumulated set state per light topic, and the
+        # topics whose state still has to reach the bridge
+        self.shadow = {}
+        self._sent_at = {}
+        self.journal = OrderedDict()
+        self.journal_dropped = 0
+        self._journal_lock = threading.Lock()
+
+        # Per-thread frame buffer (see frame())
+        self._frame_state = threading.local()
+
+        # Light state echoes (used to measure command round trips)
+        self.state_lights = set()
+        self.light_states = {}
+        self.rate_controller = None
+
         # Set up callbacks
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
+        self.client.on_disconnect = self._on_disconnect
 
     def connect(self):
-        """Connect to MQTT broker"""
+        """
+        Connect to MQTT broker
+
+        If the broker is unreachable, connecting continues in the background
+        and commands are journaled until the connection is up.
+        """
+        self._stopping = False
+        self._wake.clear()
         try:
-            self.client.connect(self.broker, self.port, 60)
+            if isinstance(self.client, LiteClient):
+                self.client.connect(self.broker, self.port, 60)
+            else:
+                # paho's network thread retries (and later reconnects) by itself
+                self.client.reconnect_delay_set(*self._reconnect_delays())
+                self.client.connect_async(self.broker, self.port, 60)
             self.client.loop_start()
-            time.sleep(1)  # Wait for connection
-            print(f"✓ Connected to MQTT broker at {self.broker}:{self.port}")
-            return True
         except Exception as e:
             print(f"✗ Failed to connect to MQTT broker: {e}")
+            self._start_reconnect()
             return False
 
+        if self._connected_event.wait(1.0):
+            print(f"✓ Connected to MQTT broker at {self.broker}:{self.port}")
+            return True
+
+        print(f"⚠ MQTT broker at {self.broker}:{self.port} not answering yet, retrying in background")
+        if isinstance(self.client, LiteClient):
+            self._start_reconnect()
+        return False
+
     def _on_connect(self, client, userdata, flags, rc):
         """Callback when connected to MQTT broker"""
         if rc == 0:
-            self.connected = True
             # Subscribe to device announcements
-            client.subscribe("zigbee2mqtt/bridge/devices")
-            print("  Subscribed to zigbee2mqtt/bridge/devices")
+            client.subscribe(f"{self.base_topic}/bridge/devices")
+            for light_name in self.state_lights:
+                client.subscribe(f"{self.base_topic}/{light_name}")
+
+            replayed = self._replay_journal(go_online=True)
+            self._connected_event.set()
+
+            if self._disconnected_at is None:
+                print(f"  Subscribed to {self.base_topic}/bridge/devices")
+            else:
+                self.last_outage_ms = round((time.monotonic() - self._disconnected_at) * 1000)
+                self._disconnected_at = None
+                print(f"  ✓ Reconnected to {self.broker}:{self.port} after {self.last_outage_ms} ms, "
+                      f"replayed {replayed} light state(s)")
         else:
             print(f"  Connection failed with code {rc}")
 
+    def _on_disconnect(self, client, userdata, rc):
+        """Callback when the connection is closed (rc 0 = requested by us)"""
+        self.connected = False
+        self._connected_event.clear()
+        if self._stopping:
+            return
+
+        now = time.monotonic()
+        if self._disconnected_at is None:
+            self._disconnected_at = now
+            self.disconnects += 1
+            print(f"  ⚠ Lost connection to MQTT broker {self.broker}:{self.port} (rc={rc}), reconnecting...")
+
+            # Commands sent just before the connection dropped may not have arrived
+            with self._journal_lock:
+                for topic, sent_at in list(self._sent_at.items()):
+                    if now - sent_at <= self.resend_window:
+                        self._mark_dirty(topic)
+
+        if isinstance(self.client, LiteClient):
+            self._start_reconnect()
+        else:
+            self.client.reconnect_delay_set(*self._reconnect_delays())
+
+    def _reconnect_delays(self) -> Tuple[float, float]:
+        """Jittered first retry delay and backoff limit"""
+        return self.reconnect_min_delay * random.uniform(0.5, 1.5), self.reconnect_max_delay
+
+    def _start_reconnect(self):
+        if self.reconnecting or self._stopping:
+            return
+        self.reconnecting = True
+        threading.Thread(target=self._reconnect_loop, name="mqtt-reconnect", daemon=True).start()
+
+    def _reconnect_loop(self):
+        """Reconnect the built-in client with jittered exponential backoff"""
+        delay = self.reconnect_min_delay
+        try:
+            while not self._stopping and not self.connected:
+                if self._wake.wait(delay * random.uniform(0.5, 1.5)):
+                    return
+                self.client.loop_stop()
+                self.client.disconnect()  # Drop the socket of a failed attempt
+                try:
+                    self.client.connect(self.broker, self.port, 60)
+                    self.client.loop_start()
+                    if self._connected_event.wait(self.reconnect_max_delay):
+                        return
+                except OSError:
+                    pass
+                delay = min(delay * 2, self.reconnect_max_delay)
+        finally:
+            self.reconnecting = False
+
+    def _mark_dirty(self, topic: str):
+        """Add a light topic to the journal (caller holds _journal_lock)"""
+        if topic not in self.shadow:
+            return  # Only light set commands are journaled
+        self.journal[topic] = None
+        self.journal.move_to_end(topic)
+        while len(self.journal) > self.journal_limit:
+            self.journal.popitem(last=False)
+            self.journal_dropped += 1
+
+    def _journal_messages(self, messages: List[Tuple[str, str]]):
+        """Keep messages that could not be published for the next connection"""
+        with self._journal_lock:
+            if self.connected:
+                # Reconnected in the meantime, the journal has been replayed already
+                try:
+                    messages = self._publish_now(messages)
+                except OSError:
+                    pass
+            for topic, _ in messages:
+                self._mark_dirty(topic)
+
+    def _replay_journal(self, go_online: bool = False) -> int:
+        """
+        Send the latest state of every journaled light in one burst
+
+        Lights whose publish is refused stay in the journal. Called with
+        go_online when a connection comes up (the connection only counts as
+        up after the burst), else to drain what is left while connected.
+
+        Returns:
+            Number of light states sent
+        """
+        with self._journal_lock:
+            messages = []
+            for topic in self.journal:
+                state = self.shadow[topic]
+                if state.get('state') == 'OFF':
+                    state = {'state': 'OFF'}  # Anything else would light the bulb up
+                messages.append((topic, json.dumps(state)))
+
+            refused = []
+            if messages:
+                try:
+                    refused = self._publish_now(messages)
+                except OSError:
+                    return 0  # Lost again, keep the journal for the next connection
+
+            refused_topics = {topic for topic, _ in refused}
+            for topic, _ in messages:
+                if topic not in refused_topics:
+                    del self.journal[topic]
+            if go_online:
+                self.connected = True
+            return len(messages) - len(refused)
+
+    def health(self) -> Dict:
+        """Connection health (for status reports)"""
+        return {
+            'connected': self.connected,
+            'reconnecting': not self.connected and not self._stopping,
+            'disconnects': self.disconnects,
+            'last_outage_ms': self.last_outage_ms,
+            'journal': len(self.journal),
+            'journal_dropped': self.journal_dropped
+        }
+
     def _on_message(self, client, userdata, msg):
         """Callback when message received"""
         try:
             payload = json.loads(msg.payload.decode())
-            if msg.topic == "zigbee2mqtt/bridge/devices":
+            if msg.topic == f"{self.base_topic}/bridge/devices":
                 self.devices = payload
                 print(f"  Discovered {len(self.devices)} Zigbee devices")
+            else:
+                light_name = msg.topic[len(self.base_topic) + 1:]
+                if light_name in self.state_lights:
+                    self.light_states[light_name] = payload
+                    if self.rate_controller:
+                        self.rate_controller.on_state_echo(light_name)
         except Exception as e:
             pass  # Ignore parsing errors
 
+    def _request_devices(self):
+        """Ask the bridge for its device list and give it time to answer"""
+        try:
+            self.client.publish(f"{self.base_topic}/bridge/request/devices", "")
+        except OSError:
+            pass  # Not connected, keep the devices seen so far
+        time.sleep(1)
+
     def discover_lights(self) -> List[str]:
         """Discover available Zigbee color lights"""
-        # Request device list
-        self.client.publish("zigbee2mqtt/bridge/request/devices", "")
-        time.sleep(1)
+        self._request_devices()
 
         # Filter for lights with color capability
         lights = []
@@ -73,8 +307,43 @@ class ZigbeeLightController:
         for light in lights:
             print(f"    - {light}")
 
+        self.subscribe_states(lights)
         return lights
 
+    def subscribe_states(self, lights: List[str]):
+        """Subscribe to the state topics of lights (resubscribed on reconnect)"""
+        for light in lights:
+            if light not in self.state_lights:
+                self.state_lights.add(light)
+                if self.connected:
+                    self.client.subscribe(f"{self.base_topic}/{light}")
+
+    def request_states(self, lights: List[str], timeout: float = 1.0) -> Dict[str, dict]:
+        """
+        Ask Zigbee2MQTT for the current state of lights and wait for the replies
+
+        Returns:
+            Dict of light name -> state payload for the lights that answered
+        """
+        self.subscribe_states(lights)
+        for light in lights:
+            self.light_states.pop(light, None)
+
+        query = json.dumps({'state': '', 'brightness': '', 'color': ''})
+        with self.frame():
+            for light in lights:
+                self._publish(f"{self.base_topic}/{light}/get", query)
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and any(light not in self.light_states for light in lights):
+            time.sleep(0.02)
+
+        return {light: self.light_states[light] for light in lights if light in self.light_states}
+
+    def attach_rate_controller(self, rate_controller):
+        """Report command sends and state echoes to an AdaptiveRateController"""
+        self.rate_controller = rate_controller
+
     def discover_motion_sensors(self) -> List[Dict[str, str]]:
         """
         Discover available Zigbee motion/occupancy sensors
@@ -87,9 +356,7 @@ class ZigbeeLightController:
                 'manufacturer': str
             }
         """
-        # Request device list
-        self.client.publish("zigbee2mqtt/bridge/request/devices", "")
-        time.sleep(1)
+        self._request_devices()
 
         # Filter for motion/occupancy sensors
         motion_sensors = []
@@ -145,8 +412,7 @@ class ZigbeeLightController:
             'transition': transition
         }
 
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
 
     def set_color_rgb(self, light_name: str, r: int, g: int, b: int, brightness: int = 254, transition: float = 0.0):
         """
@@ -168,8 +434,7 @@ class ZigbeeLightController:
             'transition': transition
         }
 
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
 
     def set_brightness(self, light_name: str, brightness: int, transition: float = 0.0):
         """Set light brightness"""
@@ -178,36 +443,115 @@ class ZigbeeLightController:
             'transition': transition
         }
 
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
 
     def turn_on(self, light_name: str):
         """Turn light on"""
         payload = {'state': 'ON'}
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
 
     def turn_off(self, light_name: str):
         """Turn light off"""
         payload = {'state': 'OFF'}
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
 
     def effect(self, light_name: str, effect: str):
         """Trigger light effect"""
         payload = {'effect': effect}
-        topic = f"zigbee2mqtt/{light_name}/set"
-        self.client.publish(topic, json.dumps(payload))
+        self._send(light_name, payload)
+
+    def _send(self, light_name: str, payload: dict):
+        """Publish a set command for one light"""
+        topic = f"{self.base_topic}/{light_name}/set"
+        self.shadow[topic] = merge_light_state(self.shadow.get(topic, {}), payload)
+        self._sent_at[topic] = time.monotonic()
+        self._publish(topic, json.dumps(payload))
+        if self.rate_controller:
+            self.rate_controller.on_command_sent(light_name)
+
+    def _publish(self, topic: str, payload: str):
+        """Publish now, or add to the open frame of the calling thread"""
+        messages = getattr(self._frame_state, 'messages', None)
+        if messages is not None:
+            messages.append((topic, payload))
+            return
+        self._publish_many([(topic, payload)])
+
+    def _publish_many(self, messages: List[Tuple[str, str]]):
+        """Publish messages in order, or journal them while the broker is unreachable"""
+        if not messages:
+            return
+        if not self.connected:
+            self._journal_messages(messages)
+            return
+        try:
+            messages = self._publish_now(messages)
+        except OSError:
+            pass
+        if messages:
+            with self._journal_lock:
+                for topic, _ in messages:
+                    self._mark_dirty(topic)
+        elif self.journal:
+            self._replay_journal()  # Publishing works again, retry what was refused before
+
+    def _publish_now(self, messages: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Publish as one socket write if the client supports it, returns the messages paho refused"""
+        publish_many = getattr(self.client, 'publish_many', None)
+        if publish_many is not None:
+            publish_many(messages)
+            return []
+
+        # paho has no batch API, its network thread writes packet by packet
+        return [(topic, payload) for topic, payload in messages
+                if self.client.publish(topic, payload).rc != 0]
+
+    def begin_frame(self):
+        """Start collecting publishes of the calling thread (frames can nest)"""
+        state = self._frame_state
+        depth = getattr(state, 'depth', 0)
+        if depth == 0:
+            state.messages = []
+        state.depth = depth + 1
+
+    def commit_frame(self):
+        """Close the frame, sending everything collected since the outermost begin_frame()"""
+        state = self._frame_state
+        state.depth -= 1
+        if state.depth == 0:
+            messages = state.messages
+            state.messages = None
+            self._publish_many(messages)
+
+    @contextmanager
+    def frame(self):
+        """
+        Batch all publishes inside the block into one write
+
+        Example:
+            with controller.frame():
+                for light in lights:
+                    controller.set_brightness(light, 100)
+        """
+        self.begin_frame()
+        try:
+            yield
+        finally:
+            self.commit_frame()
 
     def all_lights(self, lights: List[str], action: callable, *args, **kwargs):
-        """Apply action to all lights"""
-        for light in lights:
-            action(light, *args, **kwargs)
+        """Apply action to all lights (sent as one frame)"""
+        with self.frame():
+            for light in lights:
+                action(light, *args, **kwargs)
 
     def disconnect(self):
         """Disconnect from MQTT broker"""
+        self._stopping = True
+        self._wake.set()
         self.client.loop_stop()
         self.client.disconnect()
+        self.connected = False
         print("✓ Disconnected from MQTT broker")
 
 # Test code